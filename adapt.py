@@ -0,0 +1,100 @@
+"""
+Sender-side adaptation to the server's receiver reports.
+
+About once a second the server reports how a stream is arriving (see
+protocol.py). An Adapter walks a ladder of (codec, parity group) levels,
+from the quality the user picked down to the most robust one:
+
+    pcm16           full rate
+    ulaw            half the bits
+    ulaw  + fec 4   plus 25% parity: any single loss in 4 is rebuilt
+    ulaw4 + fec 4   a quarter of the bits, with parity
+    ulaw4 + fec 2   plus 50% parity
+
+It steps down one level when frames are still missing after FEC, or are
+arriving too late to play, and steps back up one level only after
+UP_AFTER_S of clean reports. A congested link gets a lower-quality but
+continuous stream, and a recovered one climbs back without flapping.
+
+The user's choice is the ceiling and LADDER the floor, and formats this
+build cannot encode are skipped. Parity the user asked for is never given
+up on the way down: every lower level keeps at least that protection (the
+same group or a smaller one), so pcm16 + fec 4 steps to ulaw + fec 4, not
+to plain ulaw. Stdlib-only so the phone client can use it.
+"""
+from protocol import FMT_PCM16, FMT_ULAW, FMT_ULAW4, FMT_NAMES
+
+LADDER = ((FMT_PCM16, 0), (FMT_ULAW, 0), (FMT_ULAW, 4), (FMT_ULAW4, 4), (FMT_ULAW4, 2))
+LOSS_HIGH = 30      # per mille missing after FEC, or late, that steps down
+LOSS_LOW = 5        # per mille missing before FEC, or late, that still counts as clean
+DOWN_HOLD_S = 2.0   # between steps down, so a report can reflect the last one
+UP_AFTER_S = 10.0   # clean this long before stepping up
+
+_BITS = {FMT_PCM16: 16, FMT_ULAW: 8, FMT_ULAW4: 4}
+
+
+def _robustness(level):
+    fmt, group = level
+    return (-_BITS[fmt], 1.0 / group if group else 0.0)
+
+
+def _ladder(top, ladder, formats):
+    """top, then each usable ladder level more robust than the one before it."""
+    group = top[1]
+    levels = [top]
+    for fmt, g in ladder:
+        if formats is not None and fmt not in formats:
+            continue
+        if group:
+            g = min(g, group) if g else group
+        if _robustness((fmt, g)) > _robustness(levels[-1]):
+            levels.append((fmt, g))
+    return levels
+
+
+def level_name(level):
+    fmt, group = level
+    return FMT_NAMES[fmt] + (f"+fec{group}" if group else "")
+
+
+class Adapter:
+    def __init__(self, fmt, fec_group=0, formats=None, ladder=LADDER, on_change=None):
+        self.levels = _ladder((fmt, fec_group), ladder, formats)
+        self.level = 0
+        self.on_change = on_change      # on_change(name, report) after each step
+        self.changes = 0
+        self._changed = None
+        self._clean_since = None
+
+    @property
+    def name(self):
+        return level_name(self.levels[self.level])
+
+    def update(self, sender, report, now_ns):
+        """Feed one protocol.Report; may switch sender.fmt and its FEC."""
+        now = now_ns / 1e9
+        if report.residual + report.late > LOSS_HIGH:
+            self._clean_since = None
+            if self.level + 1 < len(self.levels) and \
+                    (self._changed is None or now - self._changed >= DOWN_HOLD_S):
+                self._step(sender, self.level + 1, now, report)
+        elif report.loss + report.late <= LOSS_LOW:
+            if self._clean_since is None:
+                self._clean_since = now
+            elif self.level and now - self._clean_since >= UP_AFTER_S:
+                self._step(sender, self.level - 1, now, report)
+                self._clean_since = now
+        else:
+            # Lossy but FEC is coping: hold this level.
+            self._clean_since = None
+
+    def _step(self, sender, level, now, report):
+        self.level = level
+        fmt, group = self.levels[level]
+        sender.fmt = fmt
+        # Always restart parity, so no group spans two codecs.
+        sender.set_fec(group)
+        self._changed = now
+        self.changes += 1
+        if self.on_change:
+            self.on_change(self.name, report)
@@ -0,0 +1,280 @@
+"""
+Loopback end-to-end benchmark for D-MIC.
+
+A loadgen.py sender process streams over localhost to the same
+receive path as headless.py: a ReceiverEngine served by receiver.py's
+AsyncReceiver at the same service tick, with audio going to a
+clock-driven null (or WAV) sink. The engine is wrapped to time its calls
+and sample latency after each service tick. Each case reports:
+
+    throughput      packets/s and kbit/s received
+    handle/service  per-call processing time percentiles (us)
+    latency         capture-to-playout percentiles (ms), from the sender's
+                    sample clock to the moment the sample leaves the mix
+    jitter, loss    jitter buffer estimate and concealed/late frames
+    underruns       mix ring underruns/overruns
+    cpu             receiver and sender CPU per stream (% of one core), and
+                    the DSP chain's share of the receiver's
+    allocs          with --allocs, Python memory allocated while handling
+                    each packet once streaming has settled
+                    (tracemalloc peak, bytes), and how much memory outside
+                    this script was still held per packet at the end
+                    (0 = no growth);
+                    tracing slows the loop, so timings are not comparable
+                    with runs without it
+
+Cases are the product of the --frames, --rates, --codecs and --streams
+lists. Each case is appended as one JSON line to --out, tagged with the
+git commit, so runs can be diffed across changes.
+
+    python bench_loopback.py
+    python bench_loopback.py --frames 256,1024 --codecs pcm16,ulaw4 --streams 1,8 --duration 5
+    python bench_loopback.py --frames 110,220,441 --rates 44100 --low-latency
+    python bench_loopback.py --streams 1,8 --dsp highpass,gate,denoise,agc,limiter
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import codec
+import protocol
+from config import *
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentiles(values, points=(50, 95, 99), scale=1.0):
+    if not len(values):
+        return {f"p{p}": None for p in points}
+    v = np.percentile(np.asarray(values, dtype=np.float64) * scale, points)
+    return {f"p{p}": round(float(x), 3) for p, x in zip(points, v)}
+
+
+def sender_main(port, rate, frames, fmt, streams, channels, fec, wave, t0, duration, results):
+    """Synthetic phones on one clock; frame i of every stream is due at t0 + (i+1) * frames / rate."""
+    import loadgen
+    res = loadgen.run(('127.0.0.1', port), streams, rate, frames, wave, fmt, channels, fec,
+                      duration, t0=t0)
+    results.put({'sent': res['sent'], 'send_late': res['late'] + res['resyncs'],
+                 'sender_cpu_s': res['cpu_s']})
+
+
+class Tap:
+    """
+    Stands in for the engine under AsyncReceiver: times handle() and
+    service(), and after each service tick samples capture-to-playout
+    latency for every source whose playout has moved on.
+    """
+
+    def __init__(self, engine, t0, rate, frames, settled, allocs):
+        self.engine = engine
+        self.t0, self.rate, self.frames = t0, rate, frames
+        self.settled = settled      # pools and jitter target warmed up
+        self.allocs = allocs
+        self.seen = {}              # every source, kept after the engine retires it
+        self.last_seq = {}
+        self.handle_ns, self.service_ns, self.latency = [], [], []
+        self.alloc_bytes = []
+        self.growth = None          # (snapshot at settle, packets then)
+        self.packets = self.nbytes = 0
+
+    def handle(self, data, addr):
+        trace = self.allocs and time.monotonic() >= self.settled
+        if trace:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        a = time.perf_counter_ns()
+        reply = self.engine.handle(data, addr)
+        self.handle_ns.append(time.perf_counter_ns() - a)
+        self.packets += 1
+        self.nbytes += len(data)
+        if trace:
+            self.alloc_bytes.append(tracemalloc.get_traced_memory()[1] - base)
+            if self.growth is None:
+                self.growth = (tracemalloc.take_snapshot(), self.packets)
+        return reply
+
+    def service(self):
+        engine = self.engine
+        now = time.monotonic()
+        a = time.perf_counter_ns()
+        engine.service(now)
+        self.service_ns.append(time.perf_counter_ns() - a)
+        out = engine.playout
+        for key, src in list(engine.sources.items()):
+            self.seen[key] = src
+            seq = src.jb.next_seq
+            if seq is None or seq == self.last_seq.get(key) or now < self.t0:
+                continue
+            self.last_seq[key] = seq
+            # The newest mixed sample leaves the ring after lane.fill
+            # frames; it was captured at the end of frame seq - 1.
+            played = now + src.lane.fill / out.rate
+            self.latency.append(played - (self.t0 + seq * self.frames / self.rate))
+
+
+def run_case(rate, frames, codec_name, streams, args, ctx):
+    from engine import ReceiverEngine
+    from receiver import AsyncReceiver
+
+    fmt = codec.lookup(codec_name)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    low = args.low_latency
+    rcvbuf = protocol.set_rcvbuf(sock, RCVBUF_BYTES)
+    port = sock.getsockname()[1]
+    engine = ReceiverEngine(sink=args.sink,
+                            min_delay_ms=LL_JITTER_MIN_MS if low else JITTER_MIN_MS,
+                            cushion_ms=LL_CUSHION_MS if low else PLAYOUT_CUSHION_MS,
+                            dsp_chain=args.dsp)
+
+    t0 = time.monotonic() + args.warmup
+    results = ctx.Queue()
+    proc = ctx.Process(target=sender_main,
+                       args=(port, rate, frames, fmt, streams, args.channels, args.fec,
+                             args.wave, t0, args.duration, results))
+    proc.start()
+
+    tap = Tap(engine, t0, rate, frames, t0 + min(1.0, args.duration / 2), args.allocs)
+    rx = AsyncReceiver(tap, [sock], poll=(LL_POLL_MS if low else JITTER_POLL_MS) / 1000.0)
+    end = t0 + args.duration + 0.5
+
+    def done():
+        now = time.monotonic()
+        if now > end + 10 or (now >= end and not proc.is_alive()):
+            rx.stop()
+
+    rx.every(0.05, done)
+    if args.allocs:
+        tracemalloc.start()
+    cpu0, wall0 = time.process_time(), time.monotonic()
+    try:
+        rx.run()
+        cpu, wall = time.process_time() - cpu0, time.monotonic() - wall0
+        growth = tap.growth
+        if growth:
+            # The benchmark's own sample lists grow every packet; leave them out.
+            mine = [tracemalloc.Filter(False, __file__)]
+            diff = tracemalloc.take_snapshot().filter_traces(mine).compare_to(
+                growth[0].filter_traces(mine), 'filename')
+            growth = sum(d.size_diff for d in diff) / max(1, tap.packets - growth[1])
+        sent = results.get(timeout=10)
+    finally:
+        tracemalloc.stop()
+        proc.join(timeout=5)
+        underruns, overruns = engine.underruns, engine.overruns
+        engine.close()
+        sock.close()
+
+    span = max(1e-9, args.duration)
+    expected = sent['sent']
+    lost = sum(s.jb.lost for s in tap.seen.values())
+    budget = engine.dsp_budget
+    late = sum(s.jb.late for s in tap.seen.values())
+    return {
+        'rate': rate, 'frames': frames, 'codec': codec_name, 'streams': streams,
+        'channels': args.channels, 'fec': args.fec, 'wave': args.wave,
+        'low_latency': args.low_latency, 'dsp': engine.dsp_chain,
+        'duration_s': args.duration,
+        'packets_per_s': round(tap.packets / span, 1),
+        'kbit_per_s': round(tap.nbytes * 8 / span / 1000, 1),
+        'handle_us': percentiles(tap.handle_ns, scale=1e-3),
+        'service_us': percentiles(tap.service_ns, scale=1e-3),
+        'latency_ms': percentiles(tap.latency, scale=1e3),
+        'jitter_ms': round(1000 * float(np.mean([s.jb.jitter for s in tap.seen.values()] or [0])), 3),
+        'sent': expected, 'received': tap.packets,
+        'lost': lost, 'late': late,
+        'loss_pct': round(100.0 * lost / max(1, expected), 3),
+        'underruns': underruns, 'overruns': overruns,
+        'recv_cpu_pct_per_stream': round(100.0 * cpu / wall / streams, 2),
+        'send_cpu_pct_per_stream': round(100.0 * sent['sender_cpu_s'] / span / streams, 2),
+        'dsp_cpu_pct_per_stream': dict(
+            {name: round(budget.share(name), 3) for name in budget.stages},
+            total=round(budget.share(), 3)) if budget.stages else None,
+        'send_late': sent['send_late'],
+        'rcvbuf': rcvbuf,
+        'alloc_bytes_per_packet': percentiles(tap.alloc_bytes) if args.allocs else None,
+        'alloc_growth_per_packet': None if growth is None else round(growth, 1),
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def int_list(text):
+    return [int(x) for x in text.split(',') if x]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="D-MIC loopback benchmark")
+    p.add_argument('--frames', type=int_list, default=[256, 1024], help="frame sizes, e.g. 256,1024")
+    p.add_argument('--rates', type=int_list, default=[16000, 44100])
+    p.add_argument('--codecs', default='pcm16,ulaw,ulaw4')
+    p.add_argument('--streams', type=int_list, default=[1, 4])
+    p.add_argument('--channels', type=int, default=1)
+    p.add_argument('--fec', type=int, default=0)
+    p.add_argument('--wave', default='tone', help="tone | sweep | noise | speech")
+    p.add_argument('--duration', type=float, default=3.0, help="seconds per case")
+    p.add_argument('--warmup', type=float, default=1.0, help="seconds for the sender to start")
+    p.add_argument('--sink', default='null', metavar='null|FILE.wav')
+    p.add_argument('--dsp', default=DSP_CHAIN, metavar='STAGE,...',
+                   help=f"receiver clean-up chain (default {DSP_CHAIN or 'none'}; 'none' = raw)")
+    p.add_argument('--low-latency', action='store_true',
+                   help="receiver uses the low-latency profile (pair with --frames 220)")
+    p.add_argument('--allocs', action='store_true',
+                   help="trace allocations per packet (slows the receive loop)")
+    p.add_argument('--out', default=os.path.join(HERE, 'bench_output.txt'),
+                   help="JSON lines are appended here ('-' for stdout only)")
+    args = p.parse_args(argv)
+
+    codecs = [c for c in args.codecs.split(',') if c]
+    for name in codecs:
+        # codec.lookup() falls back to pcm16, which would file its results
+        # under the misspelt name.
+        if protocol.FMT_BY_NAME.get(name) not in codec.available():
+            p.error(f"unknown or unavailable codec {name!r} (choose from "
+                    f"{', '.join(protocol.FMT_NAMES[f] for f in codec.available())})")
+    ctx = mp.get_context('spawn')
+    run = {'commit': commit(), 'python': platform.python_version(),
+           'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    out = None if args.out == '-' else open(args.out, 'a')
+    try:
+        print(f"{'rate':>6} {'frm':>5} {'codec':>6} {'str':>3} | {'pkt/s':>7} {'handle p99':>10} "
+              f"{'lat p50':>7} {'lat p99':>7} {'loss%':>6} {'undr':>4} {'cpu%/str':>8}")
+        for rate, frames, name, streams in itertools.product(args.rates, args.frames,
+                                                            codecs, args.streams):
+            res = dict(run, **run_case(rate, frames, name, streams, args, ctx))
+            line = json.dumps(res)
+            if out:
+                out.write(line + '\n')
+                out.flush()
+            else:
+                print(line)
+            print(f"{rate:>6} {frames:>5} {name:>6} {streams:>3} | {res['packets_per_s']:>7} "
+                  f"{res['handle_us']['p99']:>9}u {res['latency_ms']['p50']:>7} "
+                  f"{res['latency_ms']['p99']:>7} {res['loss_pct']:>6} {res['underruns']:>4} "
+                  f"{res['recv_cpu_pct_per_stream']:>8}", flush=True)
+    finally:
+        if out:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Startup benchmark for the D-MIC receivers.
+
+Launches the receiver in a fresh interpreter several times and reports
+the median time from launch to:
+
+    window     the Tk window has been drawn (server.py only)
+    listening  the port is bound and the audio engine is loaded
+
+server.py is run with --startup-bench, which prints both moments and
+exits. headless.py is timed to its "listening" line. Exits with status 1
+if a median is over its budget, so this can gate a build.
+
+    python bench_startup.py                 # server.py, 5 runs
+    python bench_startup.py --target headless --runs 10 --json
+    python bench_startup.py --exe dist/server/server.exe
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def launch(cmd, target, timeout):
+    """One cold start. Returns {'window': s, 'listening': s} since launch."""
+    t0 = time.time()
+    proc = subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.PIPE, text=True)
+    marks = {}
+    watchdog = threading.Timer(timeout, proc.kill)
+    watchdog.start()
+    try:
+        for line in proc.stdout:
+            word, _, value = line.strip().partition(' ')
+            if target == 'headless':
+                if line.startswith('D-MIC listening'):
+                    marks['listening'] = time.time() - t0
+                    break
+            elif word in ('window', 'listening'):
+                marks[word] = float(value) - t0
+                if word == 'listening':
+                    break
+    finally:
+        watchdog.cancel()
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGINT if target == 'headless' else signal.SIGTERM)
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return marks
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="D-MIC startup benchmark")
+    p.add_argument('--target', choices=('server', 'headless'), default='server')
+    p.add_argument('--exe', default=None, help="time a packaged build instead of the script")
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--timeout', type=float, default=30.0, help="seconds per launch")
+    p.add_argument('--window-budget-ms', type=float, default=500.0)
+    p.add_argument('--listen-budget-ms', type=float, default=1500.0)
+    p.add_argument('--json', action='store_true', help="print one JSON object")
+    args = p.parse_args(argv)
+
+    if args.exe:
+        cmd = [args.exe]
+    else:
+        cmd = [sys.executable, f"{args.target}.py"]
+    if args.target == 'server':
+        cmd.append('--startup-bench')
+    else:
+        cmd += ['--stats', '0', '--port', '0']
+
+    runs = [launch(cmd, args.target, args.timeout) for _ in range(args.runs)]
+    budgets = {'window': args.window_budget_ms, 'listening': args.listen_budget_ms}
+    result = {'target': args.target, 'exe': args.exe, 'runs': args.runs}
+    over = False
+    for mark, budget in budgets.items():
+        times = [r[mark] * 1000 for r in runs if mark in r]
+        if not times:
+            continue
+        med = statistics.median(times)
+        result[mark] = {'median_ms': round(med, 1), 'min_ms': round(min(times), 1),
+                        'max_ms': round(max(times), 1), 'budget_ms': budget,
+                        'samples': len(times)}
+        over |= med > budget
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for mark in budgets:
+            if mark in result:
+                r = result[mark]
+                flag = 'OVER BUDGET' if r['median_ms'] > r['budget_ms'] else 'ok'
+                print(f"{mark:<10} median {r['median_ms']:7.1f} ms  "
+                      f"(min {r['min_ms']:.1f}, max {r['max_ms']:.1f}, "
+                      f"budget {r['budget_ms']:.0f})  {flag}")
+        if not any(m in result for m in budgets):
+            print("no startup marks seen (is a display available?)")
+    return 1 if over or not any(m in result for m in budgets) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
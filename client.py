@@ -1,12 +1,18 @@
 import socket
 import threading
+import time
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
 from kivy.uix.label import Label
 from kivy.utils import platform
+from kivy.clock import Clock
 from config import *
+import protocol
+import codec
+import adapt
+from cpumeter import CpuMeter
 
 # Check if we are on Android for native recording (Ultra Lightweight)
 if platform == 'android':
@@ -59,37 +65,65 @@ class DMicClientApp(App):
 
     def android_record_thread(self):
         # Native Android Recording Logic (No heavy dependencies)
-        buffer_size = AudioRecord.getMinBufferSize(RATE, AudioFormat.CHANNEL_IN_MONO, AudioFormat.ENCODING_PCM_16BIT)
-        recorder = AudioRecord(MediaRecorder.AudioSource.MIC, RATE, AudioFormat.CHANNEL_IN_MONO, AudioFormat.ENCODING_PCM_16BIT, buffer_size)
-        
+        n_bytes = frame_samples(RATE) * CHANNELS * 2  # PCM_16BIT is 2 bytes per sample
+        mask = AudioFormat.CHANNEL_IN_STEREO if CHANNELS == 2 else AudioFormat.CHANNEL_IN_MONO
+        min_size = AudioRecord.getMinBufferSize(RATE, mask, AudioFormat.ENCODING_PCM_16BIT)
+        recorder = AudioRecord(MediaRecorder.AudioSource.MIC, RATE, mask, AudioFormat.ENCODING_PCM_16BIT,
+                               max(min_size, n_bytes * 2))
+
+        sender = protocol.StreamSender(self.sock, (self.ip, PORT), RATE, CHANNELS,
+                                       fmt=codec.lookup(CODEC), fec_group=FEC_GROUP, planar=PLANAR,
+                                       stamp=TIMESTAMPS, ping_interval=PING_INTERVAL_S,
+                                       adapter=self.adapter())
+        sender.hello()
         recorder.startRecording()
-        buffer = [0] * buffer_size
-        
+
+        # One reusable byte buffer: AudioRecord.read(byte[]) fills it in
+        # native code, so capture makes no per-packet allocation and no
+        # Python code ever touches individual samples. Interleaved pcm16 is
+        # sent straight from a view of it; other layouts and codecs copy.
+        buffer = bytearray(n_bytes)
+        view = memoryview(buffer)
+        cpu = CpuMeter()
+
         while self.running:
             # Read from native buffer
-            read_count = recorder.read(buffer, 0, len(buffer))
+            read_count = recorder.read(buffer, 0, n_bytes)
             if read_count > 0:
                 try:
-                    # Convert to bytes (PCM_16BIT is 2 bytes per sample)
-                    # We use a bytearray for speed
-                    raw_data = bytearray()
-                    for s in buffer[:read_count]:
-                        # Low-level packing of 16-bit short to bytes
-                        raw_data.append(s & 0xff)
-                        raw_data.append((s >> 8) & 0xff)
-                    
-                    self.sock.sendto(bytes(raw_data), (self.ip, PORT))
+                    pcm = sender.layout(view[:read_count])
+                    sender.send(codec.encode(sender.fmt, pcm), read_count // (2 * CHANNELS))
                 except Exception as e:
                     print(f"UDP Error: {e}")
                     break
-            
+            load = cpu.tick()
+            if load is not None:
+                self.show_cpu(load)
+
+        sender.bye()
         recorder.stop()
         recorder.release()
 
-    def desktop_audio_callback(self, indata, frames, time, status):
+    def adapter(self):
+        # Follows the server's loss reports down and back up the quality ladder.
+        if not ADAPT:
+            return None
+        return adapt.Adapter(codec.lookup(CODEC), FEC_GROUP, codec.available(),
+                             on_change=lambda name, r: print(f"Adapt -> {name} "
+                                                             f"(loss {r.loss / 10:.1f}%)"))
+
+    def show_cpu(self, load):
+        text = f"Streaming to {self.ip}... CPU {load * 100:.1f}%"
+        Clock.schedule_once(lambda dt: setattr(self.status, 'text', text) if self.running else None)
+
+    def desktop_audio_callback(self, indata, frames, time_info, status):
         if self.running and self.sock:
             try:
-                self.sock.sendto(indata.tobytes(), (self.ip, PORT))
+                # PortAudio's ADC time is on the stream clock; move it to ours.
+                age = time_info.currentTime - time_info.inputBufferAdcTime
+                captured = time.monotonic_ns() - int(age * 1e9) if age > 0 else None
+                pcm = self.sender.layout(indata.tobytes())
+                self.sender.send(codec.encode(self.sender.fmt, pcm), frames, captured)
             except: pass
 
     def toggle_mic(self, instance):
@@ -109,8 +143,16 @@ class DMicClientApp(App):
                 if platform == 'android':
                     threading.Thread(target=self.android_record_thread, daemon=True).start()
                 else:
+                    self.sender = protocol.StreamSender(self.sock, (self.ip, PORT), RATE, CHANNELS,
+                                                        fmt=codec.lookup(CODEC), fec_group=FEC_GROUP,
+                                                        planar=PLANAR, stamp=TIMESTAMPS,
+                                                        ping_interval=PING_INTERVAL_S,
+                                                        adapter=self.adapter())
+                    self.sender.hello()
                     self.stream = sd.InputStream(samplerate=RATE, channels=CHANNELS, dtype='int16', 
-                                               callback=self.desktop_audio_callback, blocksize=CHUNK)
+                                               callback=self.desktop_audio_callback,
+                                               blocksize=frame_samples(RATE),
+                                               latency='low' if LOW_LATENCY else 'high')
                     self.stream.start()
             except Exception as e:
                 self.status.text = f"Error: {e}"
@@ -119,6 +161,7 @@ class DMicClientApp(App):
             if platform != 'android' and hasattr(self, 'stream'):
                 self.stream.stop()
                 self.stream.close()
+                self.sender.bye()
             if self.sock: self.sock.close()
             self.btn_toggle.text = "START MIC"
             self.btn_toggle.background_color = (0.2, 0.2, 0.2, 1)
@@ -2,9 +2,17 @@ import socket
 
 # Audio Configuration
 RATE = 44100
-CHANNELS = 1
+CHANNELS = 1            # captured channels; 2 for phones with a stereo mic pair
 CHUNK = 1024
 PORT = 50005
+CODEC = 'pcm16'         # pcm16 | ulaw (2x smaller) | ulaw4 (~4x smaller)
+FEC_GROUP = 0           # send XOR parity every N frames (0 = off, 4 = +25% bandwidth)
+PLANAR = False          # send channels back to back so the server can drop extras unread
+MAX_CHANNELS = 2        # most channels the server plays; senders are told to drop the rest
+TIMESTAMPS = True       # stamp capture times and ping the server, for the latency readout
+PING_INTERVAL_S = 1.0   # clock-offset probe interval while streaming
+REPORT_INTERVAL_S = 1.0 # receiver reports back to each sender (0 = off)
+ADAPT = True            # senders step codec/parity down (and back up) on those reports
 
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -17,3 +25,64 @@ def get_local_ip():
     finally:
         s.close()
     return IP
+
+# Jitter Buffer
+JITTER_MIN_MS = 10      # never play out sooner than this after capture
+JITTER_MAX_MS = 200     # upper bound for the adaptive target delay
+JITTER_MULT = 4.0       # target delay = JITTER_MULT * measured jitter
+JITTER_POLL_MS = 5      # receiver wakes at least this often to play out
+MAX_CONCEAL_MS = 200    # lost audio filled before going quiet; at least PLC_FADE_MS
+
+# Packet Loss Concealment
+PLC_FADE_MS = 80        # concealment fades to silence over this long
+PLC_XFADE_MS = 3        # cross-fade back into real audio after a loss
+
+# Playout
+PLAYOUT_BUFFER_MS = 500     # ring buffer capacity between receiver and sound card
+PLAYOUT_CUSHION_MS = 15     # slack kept ahead of the device callback
+DEVICE_RETRY_S = 1.0        # after the output device fails to open, try again this often
+DRIFT_CORRECT = True        # trim each source's rate to the sound card's clock
+DRIFT_MAX_PPM = 1000        # largest trim; 1000 ppm is under 2 cents of pitch
+
+# Low-latency profile: short frames on the sender, shallow buffers on the receiver.
+# Front ends switch it per run (--low-latency, the LOW LATENCY box, the phone's LAT button).
+LOW_LATENCY = False
+LL_FRAME_MS = 5         # packet duration, 2.5-10 ms (CHUNK is ~23 ms at 44.1 kHz)
+LL_JITTER_MIN_MS = 4    # jitter buffer floor
+LL_CUSHION_MS = 5       # playout slack ahead of the device callback
+LL_POLL_MS = 1          # receiver service tick; must stay well under a frame
+
+def frame_samples(rate, low_latency=LOW_LATENCY):
+    """Samples per channel in one packet."""
+    if low_latency:
+        return max(32, rate * LL_FRAME_MS // 1000)
+    return CHUNK
+
+# Clean-up DSP on the server, per source, between decode and playout (see dsp.py)
+DSP_CHAIN = ''          # opt-in stages, in order: highpass,gate,denoise,agc,limiter
+HIGHPASS_HZ = 80        # cuts DC and handling rumble below this
+GATE_DB = -50           # gate opens above this level (dBFS); AGC ignores quieter blocks
+AGC_TARGET_DB = -20     # speech level the AGC aims for (dBFS RMS)
+AGC_MAX_GAIN_DB = 20    # most the AGC boosts (or cuts)
+LIMIT_DB = -1           # limiter ceiling (dBFS peak)
+DENOISE_DB = 12         # most the noise suppressor takes off the noise floor
+DSP_BUDGET_PCT = 5.0    # share of one core per stream the whole chain may use
+
+# VU Meter
+VU_REFRESH_MS = 50      # GUI polls the meter this often, independent of packet rate
+VU_HOLD_MS = 1000       # peak-hold marker stays put this long before falling
+
+# Network
+MAX_PACKET = 64 + 16 * CHUNK    # receive buffer: headers + CHUNK at MAX_WIRE_CHANNELS (8) int16
+RCVBUF_STREAMS = 4      # the socket buffer rides out a PLAYOUT_BUFFER_MS stall for this many senders
+RCVBUF_BYTES = RCVBUF_STREAMS * MAX_PACKET * (PLAYOUT_BUFFER_MS * RATE // (1000 * CHUNK) + 1)
+
+# Sources
+SOURCE_TIMEOUT_S = 5    # forget a sender after this long without packets
+
+# Metrics
+METRICS_PORT = 0        # serve /metrics and /metrics.json on this port (0 = off)
+METRICS_HOST = '127.0.0.1'  # '0.0.0.0' to let a remote Prometheus scrape it
+
+# Profiling
+PROFILE = False         # time each loop stage (also DMIC_PROFILE=1); dumped on exit
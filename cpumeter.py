@@ -0,0 +1,26 @@
+"""
+Per-thread CPU load sampling.
+
+Call tick() from the thread being measured; once per interval it returns
+the share of one core that thread used since the previous figure (1.0 =
+one core busy the whole time). Uses time.thread_time, so other threads
+and processes never inflate the number.
+"""
+import time
+
+
+class CpuMeter:
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.load = 0.0
+        self._wall = time.monotonic()
+        self._cpu = time.thread_time()
+
+    def tick(self):
+        now = time.monotonic()
+        if now - self._wall < self.interval:
+            return None
+        cpu = time.thread_time()
+        self.load = (cpu - self._cpu) / (now - self._wall)
+        self._wall, self._cpu = now, cpu
+        return self.load
@@ -7,6 +7,9 @@ If app crashes, check that file for details.
 BEFORE RUNNING:
    1. pip install kivy pyjnius
    2. Settings > Apps > Pydroid 3 > Permissions > Microphone > Allow
+   3. Copy protocol.py, codec.py and fec.py into the same folder as this file;
+      adapt.py, profiler.py and loadgen.py too for adaptation, profiling and
+      the mock source (each is optional)
 
 Developed by Soham
 """
@@ -14,24 +17,113 @@ Developed by Soham
 # ═══════════════════════════════════════════════════════════════
 # STEP 0: FILE-BASED ERROR LOGGER (before ANY other import)
 #   If the app crashes, check ~/dmic_log.txt on your phone
+#   log() only queues; a background thread batches, rate-limits,
+#   rotates and writes, so the audio thread never waits on flash.
+#   log_exc() / log_flush() write synchronously for fatal paths.
 # ═══════════════════════════════════════════════════════════════
 import os
 import sys
+import threading
+import traceback
+import atexit
+from collections import deque
+from time import monotonic as _mono
 
 _LOG_PATH = os.path.join(os.path.expanduser('~'), 'dmic_log.txt')
+_LOG_MAX_BYTES  = 512 * 1024   # rotate to dmic_log.txt.1 past this size
+_LOG_QUEUE_MAX  = 1000         # lines held in memory; oldest dropped first
+_LOG_FLUSH_SECS = 0.5          # writer batches lines for this long
+_LOG_BURST      = 5            # identical lines allowed per window...
+_LOG_WINDOW     = 10.0         # ...of this many seconds
+
+
+class _AsyncLog:
+    def __init__(self, path):
+        self.path = path
+        self._q = deque(maxlen=_LOG_QUEUE_MAX)
+        self._wake = threading.Event()
+        self._io = threading.Lock()
+        self._seen = {}            # line -> [window start, count]
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="DMIC-Log", daemon=True)
+        self._thread.start()
+
+    def put(self, line):
+        now = _mono()
+        rec = self._seen.get(line)
+        if rec is None or now - rec[0] > _LOG_WINDOW:
+            if rec and rec[1] > _LOG_BURST:
+                self._q.append(f"{line}  (x{rec[1] - _LOG_BURST} more suppressed)")
+            if len(self._seen) > 256:
+                self._seen.clear()
+            self._seen[line] = [now, 1]
+        else:
+            rec[1] += 1
+            if rec[1] > _LOG_BURST:
+                return
+        if len(self._q) == self._q.maxlen:
+            self.dropped += 1
+        self._q.append(line)
+
+    def _run(self):
+        while True:
+            self._wake.wait(_LOG_FLUSH_SECS)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self, suppressed=False):
+        """Write what is queued; with `suppressed`, also the counts still held back."""
+        with self._io:
+            if suppressed:
+                for line, rec in list(self._seen.items()):
+                    if rec[1] > _LOG_BURST:
+                        self._q.append(f"{line}  (x{rec[1] - _LOG_BURST} more suppressed)")
+                        rec[1] = _LOG_BURST
+            lines = []
+            try:
+                while True:
+                    lines.append(self._q.popleft())
+            except IndexError:
+                pass
+            if self.dropped:
+                lines.append(f"[DMIC] log queue full: {self.dropped} lines dropped")
+                self.dropped = 0
+            if not lines:
+                return
+            text = '\n'.join(lines) + '\n'
+            try:
+                if os.path.getsize(self.path) > _LOG_MAX_BYTES:
+                    os.replace(self.path, self.path + '.1')
+            except OSError:
+                pass
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(text)
+            except:
+                pass
+            try:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            except:
+                pass
+
+
+_log = _AsyncLog(_LOG_PATH)
+atexit.register(_log.flush, suppressed=True)
 
 def log(msg):
-    """Write to file AND console. Survives crashes."""
-    line = f"[DMIC] {msg}"
-    try:
-        with open(_LOG_PATH, 'a') as f:
-            f.write(line + '\n')
-    except:
-        pass
-    try:
-        print(line, flush=True)
-    except:
-        pass
+    """Queue a line for the log file and console. Never blocks."""
+    _log.put(f"[DMIC] {msg}")
+
+def log_flush():
+    """Write everything queued, and any suppressed counts, now, on the calling thread."""
+    _log.flush(suppressed=True)
+
+def log_exc():
+    """Log the current exception's traceback and flush. For fatal paths."""
+    for line in traceback.format_exc().rstrip().splitlines():
+        _log._q.append(line)
+    log_flush()
 
 # Clear old log
 try:
@@ -50,16 +142,45 @@ log("══════ D-MIC v5 Starting ══════")
 try:
     import struct
     import socket
-    import threading
     import time
     import math
-    import traceback
     import platform as plat
+    import protocol
+    import codec
     log("Basic imports: OK")
 except Exception as e:
     log(f"FATAL: Basic import failed: {e}")
+    log_exc()
     sys.exit(1)
 
+# Optional extras: a missing file turns its feature off, not the app.
+try:
+    import profiler
+except Exception as e:
+    profiler = None
+    log(f"profiler.py not loaded ({e}): stage profiling off")
+try:
+    import adapt
+except Exception as e:
+    adapt = None
+    log(f"adapt.py not loaded ({e}): codec/FEC adaptation off")
+try:
+    import loadgen
+except Exception as e:
+    loadgen = None
+    log(f"loadgen.py not loaded ({e}): no mock source")
+
+
+class _NoProfile:
+    """profiler.OFF, for when profiler.py is missing."""
+    enabled = False
+
+    def start(self):
+        return 0
+
+    def lap(self, stage, t0):
+        return t0
+
 # ═══════════════════════════════════════════════════════════════
 # STEP 2: Kivy (import BEFORE jnius to avoid JVM conflicts)
 # ═══════════════════════════════════════════════════════════════
@@ -91,12 +212,7 @@ try:
     log("Kivy: ALL imports OK ✓")
 except Exception as e:
     log(f"FATAL: Kivy import failed: {e}")
-    traceback.print_exc()
-    # Write to log file too
-    try:
-        with open(_LOG_PATH, 'a') as f:
-            traceback.print_exc(file=f)
-    except: pass
+    log_exc()
     sys.exit(1)
 
 # ═══════════════════════════════════════════════════════════════
@@ -214,11 +330,30 @@ def check_mic_permission():
 class AudioEngine:
     RATES   = [44100, 22050, 16000, 8000]
     SHORTS  = 1024
+    LOW_FRAME_MS = 5    # LAT button: packet duration in low-latency mode (2.5-10 ms)
     RETRIES = 3
+    FEC     = 0     # XOR parity every N packets (0 = off)
+    CHANNELS = 1    # 2 = try the stereo mic pair first, fall back to mono
+    PLANAR  = False # channels back to back on the wire
+    STAMP   = True  # capture timestamps + clock pings for the server's latency readout
+    ADAPT   = True  # step codec/FEC down (and back up) on the server's loss reports
+    TS_EVERY = 50   # packets between AudioRecord.getTimestamp refreshes
+    PROFILE = False # time each loop stage (or DMIC_PROFILE=1); table goes to the log
+    PROF_EVERY = 2000   # packets between profile dumps, plus one when streaming stops
+    # Mock source (no mic, or desktop): a load generator for the server
+    MOCK_RATE    = 44100
+    MOCK_FRAMES  = 1024
+    MOCK_STREAMS = 1    # concurrent synthetic phones
+    MOCK_WAVE    = 'tone'   # tone | sweep | noise | speech
+    VU_STRIDE = 16  # meter every Nth sample
+    VU_EVERY_MS = 20    # meter at most this often; short frames skip packets
 
     def __init__(self):
         self.streaming = False
         self.vu_level  = 0.0
+        self.fmt       = protocol.FMT_PCM16
+        self.low_latency = False
+        self.report    = ''     # frame size, packet rate, capture delay, RTT, level while streaming
         self._thread   = None
         log("AudioEngine: created")
 
@@ -239,6 +374,13 @@ class AudioEngine:
             self._thread.join(timeout=3)
         self._thread = None
         self.vu_level = 0.0
+        self.report = ''
+
+    def frames(self, rate):
+        """Samples per channel in one packet."""
+        if self.low_latency:
+            return max(32, rate * self.LOW_FRAME_MS // 1000)
+        return self.SHORTS
 
     def _run_safe(self, ip, port):
         try:
@@ -249,10 +391,7 @@ class AudioEngine:
                 self._run_mock(ip, port)
         except Exception as e:
             log(f"AUDIO FATAL: {e}")
-            try:
-                with open(_LOG_PATH, 'a') as f:
-                    traceback.print_exc(file=f)
-            except: pass
+            log_exc()
         finally:
             self.streaming = False
             self.vu_level = 0.0
@@ -275,35 +414,48 @@ class AudioEngine:
                 MR = autoclass('android.media.MediaRecorder')
 
                 MONO  = AF.CHANNEL_IN_MONO
+                MASKS = {1: MONO, 2: AF.CHANNEL_IN_STEREO}
                 PCM16 = AF.ENCODING_PCM_16BIT
                 MIC   = MR.AudioSource.MIC
                 INIT  = AR.STATE_INITIALIZED
 
-                # ── Find working sample rate ──
+                # ── Find working channel count + sample rate ──
                 recorder = None
                 rate_used = 0
+                ch_used = 1
+                configs = [(ch, rate) for ch in sorted({self.CHANNELS, 1}, reverse=True)
+                           for rate in self.RATES]
 
-                for rate in self.RATES:
+                for ch, rate in configs:
                     try:
-                        mb = AR.getMinBufferSize(rate, MONO, PCM16)
-                        log(f"  {rate}Hz → minBuf={mb}")
+                        mb = AR.getMinBufferSize(rate, MASKS[ch], PCM16)
+                        log(f"  {rate}Hz x{ch} → minBuf={mb}")
                         if mb <= 0:
                             continue
 
-                        bsz = max(mb * 4, 8192)
-                        r = AR(MIC, rate, MONO, PCM16, bsz)
-                        s = r.getState()
-                        log(f"  {rate}Hz → state={s}")
+                        # Low latency: the smallest buffer that still holds two
+                        # packets, doubled if the device refuses it.
+                        fb = self.frames(rate) * ch * 2
+                        if self.low_latency:
+                            sizes = [max(mb, 2 * fb), max(mb * 2, 4 * fb)]
+                        else:
+                            sizes = [max(mb * 4, 8192 * ch)]
+                        for bsz in sizes:
+                            r = AR(MIC, rate, MASKS[ch], PCM16, bsz)
+                            s = r.getState()
+                            log(f"  {rate}Hz x{ch} buf={bsz} → state={s}")
+                            if s == INIT:
+                                recorder = r
+                                break
+                            r.release()
 
-                        if s == INIT:
-                            recorder = r
+                        if recorder:
                             rate_used = rate
-                            log(f"  ✓ Using {rate}Hz")
+                            ch_used = ch
+                            log(f"  ✓ Using {rate}Hz x{ch}")
                             break
-                        else:
-                            r.release()
                     except Exception as e:
-                        log(f"  {rate}Hz error: {e}")
+                        log(f"  {rate}Hz x{ch} error: {e}")
 
                 if not recorder:
                     log("✗ All sample rates failed")
@@ -318,24 +470,52 @@ class AudioEngine:
                 log(f"UDP → {ip}:{port}")
                 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
                 addr = (ip, port)
+                sender = protocol.StreamSender(sock, addr, rate_used, ch_used,
+                                               fmt=self.fmt, fec_group=self.FEC,
+                                               planar=self.PLANAR, stamp=self.STAMP,
+                                               adapter=self._adapter())
+                acked = sender.hello()
+                log(f"Handshake: {'ACK ✓' if acked else 'no reply (sending anyway)'}"
+                    f" {sender.channels}/{ch_used}ch")
 
                 # ── Buffer ──
+                # One reused bytearray that AudioRecord.read(byte[]) fills in
+                # native code. We send a view of it and meter a strided
+                # short view, so the loop allocates no buffers and Python
+                # only looks at SHORTS/VU_STRIDE samples per packet.
+                # Stereo reads SHORTS frames of interleaved L/R.
+                frames = self.frames(rate_used)
+                n_shorts = frames * ch_used
+                n_bytes = n_shorts * 2
+                raw = bytearray(n_bytes)
+                raw_mv = memoryview(raw)
+                raw_h = raw_mv.cast('h')
                 use_jarray = False
                 java_buf = None
-                n_shorts = self.SHORTS
+
+                # ── Capture clock ──
+                # AudioRecord.getTimestamp (API 24+) pins a frame position
+                # to a CLOCK_MONOTONIC time, the same clock the sender
+                # stamps with. Refreshed every TS_EVERY packets; without it
+                # the sender assumes each buffer just finished.
+                ats = None
+                ts_anchor = None
+                pos = 0
+                if self.STAMP:
+                    try:
+                        AT = autoclass('android.media.AudioTimestamp')
+                        ats = AT()
+                        TB_MONO = AT.TIMEBASE_MONOTONIC
+                    except Exception as e:
+                        log(f"AudioTimestamp unavailable: {e}")
 
                 if _jarray_fn:
                     try:
                         java_buf = _jarray_fn('h')(n_shorts)
-                        use_jarray = True
-                        log(f"jarray buffer: {n_shorts} shorts ✓")
+                        log(f"jarray fallback ready: {n_shorts} shorts")
                     except Exception as e:
                         log(f"jarray failed: {e}")
 
-                if not use_jarray:
-                    log("Using byte[] fallback")
-                    n_bytes = n_shorts * 2
-
                 # ── Start ──
                 recorder.startRecording()
                 rs = recorder.getRecordingState()
@@ -350,36 +530,93 @@ class AudioEngine:
                         continue
                     return
 
-                log(f"★ STREAMING {rate_used}Hz → {ip}:{port} ★")
+                log(f"★ STREAMING {rate_used}Hz x{sender.channels} {protocol.FMT_NAMES[self.fmt]} → {ip}:{port} ★")
 
                 pkt = 0
                 errs = 0
+                prof = profiler.get('sender', True if self.PROFILE else None) \
+                    if profiler else _NoProfile()
+                # Per-packet work that does not need to happen per packet is
+                # spread out by time, so short frames do not multiply it.
+                frame_ms = frames * 1000 / rate_used
+                ts_every = max(1, self.TS_EVERY * self.SHORTS // frames)
+                vu_every = max(1, int(self.VU_EVERY_MS // frame_ms))
+                if self.low_latency:
+                    try:
+                        AP = autoclass('android.os.Process')
+                        AP.setThreadPriority(AP.THREAD_PRIORITY_URGENT_AUDIO)
+                    except Exception as e:
+                        log(f"Audio priority unavailable: {e}")
+                rep_t = time.monotonic()
+                rep_pkt = 0
+                cap_ms = None
 
                 while self.streaming:
                     try:
+                        t = prof.start()
+                        if ats is not None and pkt % ts_every == 0:
+                            try:
+                                if recorder.getTimestamp(ats, TB_MONO) == 0:
+                                    ts_anchor = (ats.framePosition, ats.nanoTime)
+                            except Exception as e:
+                                log(f"getTimestamp failed: {e}")
+                                ats = None
+                        cap = None
+                        if ts_anchor:
+                            cap = ts_anchor[1] + (pos - ts_anchor[0]) * 1000000000 // rate_used
+                        t = prof.lap('clock', t)
                         if use_jarray:
                             n = recorder.read(java_buf, 0, n_shorts)
+                            t = prof.lap('read', t)     # includes waiting for the mic
                             if n > 0:
-                                data = struct.pack(f'<{n}h', *java_buf[:n])
-                                sock.sendto(data, addr)
-                                pk = max(abs(java_buf[i]) for i in range(0, n, max(1, n//16)))
-                                self.vu_level = min(1.0, pk / 10000.0)
+                                data = sender.layout(struct.pack(f'<{n}h', *java_buf[:n]))
+                                payload = codec.encode(sender.fmt, data)
+                                t = prof.lap('pack', t)
+                                sender.send(payload, n // ch_used, cap)
+                                t = prof.lap('send', t)
+                                pos += n // ch_used
+                                if pkt % vu_every == 0:
+                                    pk = max(abs(java_buf[i]) for i in range(0, n, max(1, n//16)))
+                                    self.vu_level = min(1.0, pk / 10000.0)
+                                t = prof.lap('meter', t)
                         else:
-                            bb = bytearray(n_bytes)
-                            n = recorder.read(bb, 0, n_bytes)
+                            n = recorder.read(raw, 0, n_bytes)
+                            t = prof.lap('read', t)     # includes waiting for the mic
                             if n > 0:
-                                sock.sendto(bytes(bb[:n]), addr)
-                                pk = 0
-                                for i in range(0, min(n, 128), 2):
-                                    v = abs(struct.unpack_from('<h', bb, i)[0])
-                                    if v > pk: pk = v
-                                self.vu_level = min(1.0, pk / 10000.0)
+                                ns = n // 2
+                                pcm = sender.layout(raw_mv[:n])
+                                payload = codec.encode(sender.fmt, pcm)
+                                t = prof.lap('pack', t)
+                                sender.send(payload, ns // ch_used, cap)
+                                t = prof.lap('send', t)
+                                pos += ns // ch_used
+                                if pkt % vu_every == 0:
+                                    sv = raw_h[:ns:self.VU_STRIDE]
+                                    pk = max(max(sv), -min(sv))
+                                    self.vu_level = min(1.0, pk / 10000.0)
+                                t = prof.lap('meter', t)
 
                         if n > 0:
                             pkt += 1
                             errs = 0
                             if pkt <= 5 or pkt % 200 == 0:
                                 log(f"PKT #{pkt} VU={self.vu_level:.2f}")
+                            now = time.monotonic()
+                            if now - rep_t >= 1.0:
+                                # Achieved rate, and how old a packet's first
+                                # sample is when it goes out.
+                                if cap is not None:
+                                    cap_ms = (time.monotonic_ns() - cap) / 1e6
+                                rtt = sender.rtt
+                                pps = (pkt - rep_pkt) / (now - rep_t)
+                                self.report = (f"{frame_ms:.1f}ms × {pps:.0f}/s"
+                                               + (f" · cap {cap_ms:.0f}ms" if cap_ms else "")
+                                               + (f" · rtt {rtt / 1e6:.0f}ms" if rtt else "")
+                                               + self._level(sender))
+                                rep_t, rep_pkt = now, pkt
+                            if prof.enabled and pkt % self.PROF_EVERY == 0:
+                                log(prof.report())
+                            prof.lap('log', t)
                         elif n == 0:
                             time.sleep(0.002)
                         else:
@@ -390,15 +627,23 @@ class AudioEngine:
                             time.sleep(0.01)
 
                     except Exception as ex:
+                        if not use_jarray and not pkt and java_buf is not None:
+                            # Some pyjnius builds cannot pass a bytearray as byte[].
+                            log(f"byte[] read failed ({ex}), using jarray")
+                            use_jarray = True
+                            continue
                         log(f"Loop err: {ex}")
                         time.sleep(0.01)
 
+                sender.bye()
+                if prof.enabled:
+                    log(prof.report())
                 log(f"Done. {pkt} packets sent.")
                 return  # success, no retry
 
             except Exception as ex:
                 log(f"Attempt {attempt+1} err: {ex}")
-                traceback.print_exc()
+                log(traceback.format_exc().rstrip())
                 if attempt < self.RETRIES - 1:
                     time.sleep(2)
             finally:
@@ -409,23 +654,54 @@ class AudioEngine:
                     try: sock.close()
                     except: pass
 
+    def _adapter(self):
+        if not self.ADAPT or adapt is None:
+            return None
+        return adapt.Adapter(self.fmt, self.FEC, codec.available(),
+                             on_change=lambda name, r: log(
+                                 f"Adapt → {name} (loss {r.loss / 10:.1f}%, "
+                                 f"after FEC {r.residual / 10:.1f}%, late {r.late / 10:.1f}%)"))
+
+    def _level(self, sender):
+        # Shown once the server reports and the link is not perfect.
+        r = sender.report
+        if r is None or not (r.loss or r.late or sender.adapter and sender.adapter.level):
+            return ""
+        name = sender.adapter.name if sender.adapter else protocol.FMT_NAMES[sender.fmt]
+        return f" · {name} loss {(r.loss + r.late) / 10:.1f}%"
+
     def _run_mock(self, ip, port):
-        log(f"Mock → {ip}:{port}")
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        addr = (ip, port)
-        t = pkt = 0
-        while self.streaming:
-            buf = b''.join(
-                struct.pack('<h', int(8000*math.sin(2*math.pi*440*(t+i)/44100)))
-                for i in range(1024)
-            )
-            t += 1024
-            try: sock.sendto(buf, addr); pkt += 1
-            except: pass
-            self.vu_level = 0.3 + 0.2*math.sin(time.time()*3)
-            if pkt <= 3 or pkt % 100 == 0: log(f"Mock #{pkt}")
-            time.sleep(0.023)
-        sock.close()
+        # Precomputed waveform slices, paced on monotonic deadlines:
+        # no per-sample Python work and no drift however long it runs.
+        if loadgen is None:
+            log("Mock source needs loadgen.py next to this file")
+            return
+        frames = self.frames(self.MOCK_RATE) if self.low_latency else self.MOCK_FRAMES
+        frame_ms = frames * 1000 / self.MOCK_RATE
+        vu_every = max(1, int(self.VU_EVERY_MS // frame_ms))
+        per_sec = max(1, round(1000 / frame_ms))
+        log(f"Mock → {ip}:{port} {self.MOCK_STREAMS} x {self.MOCK_WAVE} "
+            f"{self.MOCK_RATE}Hz/{frames}")
+        rep = [time.monotonic()]
+
+        def on_frame(i, pcm):
+            if i % vu_every == 0:
+                sv = pcm[::self.VU_STRIDE]
+                self.vu_level = min(1.0, max(max(sv), -min(sv)) / 10000.0)
+            if i < 3 or (i + 1) % 100 == 0:
+                log(f"Mock #{i + 1}")
+            if (i + 1) % per_sec == 0:
+                now = time.monotonic()
+                self.report = f"{frame_ms:.1f}ms × {per_sec / (now - rep[0]):.0f}/s"
+                rep[0] = now
+
+        res = loadgen.run((ip, port), self.MOCK_STREAMS, self.MOCK_RATE, frames,
+                          self.MOCK_WAVE, self.fmt, fec=self.FEC,
+                          stop=lambda: not self.streaming, on_frame=on_frame,
+                          adapt=self.ADAPT and adapt is not None, on_change=lambda k, name, r: log(
+                              f"Adapt {k} → {name} (loss {r.loss / 10:.1f}%)"))
+        log(f"Mock done: {res['sent']} packets, late {res['late']}, "
+            f"resyncs {res['resyncs']}, errors {res['errors']}")
         self.vu_level = 0
 
 
@@ -548,6 +824,7 @@ class DMicApp(App):
             self.engine = AudioEngine()
             self.wakelock = WakeLockMgr()
             self._on = False
+            self._dest = ''
             self._logs = []
             log("DMicApp init OK")
         except Exception as e:
@@ -560,9 +837,7 @@ class DMicApp(App):
             return self._build_ui()
         except Exception as e:
             log(f"build() FAIL: {e}")
-            with open(_LOG_PATH, 'a') as f:
-                traceback.print_exc(file=f)
-            traceback.print_exc()
+            log_exc()
             # Return a minimal error screen
             root = FloatLayout()
             root.add_widget(Label(
@@ -682,6 +957,23 @@ class DMicApp(App):
             padding=[dp(8)]*4, input_filter='int'
         )
         ptr.add_widget(self.port_in)
+        self.codec_btn = Button(
+            text=protocol.FMT_NAMES[self.engine.fmt].upper(),
+            font_size=sp(10), bold=True,
+            size_hint_x=None, width=dp(64),
+            background_normal='', background_color=[.04, .04, .06, 1],
+            color=C_PURPLE
+        )
+        self.codec_btn.bind(on_release=self._codec_tap)
+        ptr.add_widget(self.codec_btn)
+        self.lat_btn = Button(
+            text='STD', font_size=sp(10), bold=True,
+            size_hint_x=None, width=dp(48),
+            background_normal='', background_color=[.04, .04, .06, 1],
+            color=C_PURPLE
+        )
+        self.lat_btn.bind(on_release=self._lat_tap)
+        ptr.add_widget(self.lat_btn)
         card.add_widget(ptr)
         root.add_widget(card)
 
@@ -754,6 +1046,8 @@ class DMicApp(App):
             if self._on:
                 self.mic_lbl.text = f'MIC\n{int(lv*100)}%'
                 self.mic_lbl.color = C_CYAN if lv < 0.7 else C_RED
+                if self.engine.report:
+                    self.status_lbl.text = f'{self._dest}  {self.engine.report}'
         except: pass
 
     # ── Button ──
@@ -767,9 +1061,27 @@ class DMicApp(App):
                 self._start()
         except Exception as e:
             log(f"BTN ERROR: {e}")
-            traceback.print_exc()
+            log(traceback.format_exc().rstrip())
             self._ui_log(f"Error: {e}")
 
+    def _codec_tap(self, *a):
+        if self._on:
+            return
+        fmts = codec.available()
+        i = fmts.index(self.engine.fmt) if self.engine.fmt in fmts else -1
+        self.engine.fmt = fmts[(i + 1) % len(fmts)]
+        name = protocol.FMT_NAMES[self.engine.fmt]
+        self.codec_btn.text = name.upper()
+        self._ui_log(f"Codec: {name}")
+
+    def _lat_tap(self, *a):
+        if self._on:
+            return
+        low = self.engine.low_latency = not self.engine.low_latency
+        self.lat_btn.text = 'LOW' if low else 'STD'
+        self._ui_log(f"Latency: low, {self.engine.LOW_FRAME_MS} ms frames" if low
+                     else "Latency: standard")
+
     def _start(self):
         ip = self.ip_in.text.strip()
         port = int(self.port_in.text.strip() or '50005')
@@ -799,7 +1111,8 @@ class DMicApp(App):
         self.engine.start(ip, port)
         self._on = True
 
-        self._set_status(f'Streaming to {ip}:{port}', C_GREEN)
+        self._dest = f'{ip}:{port}'
+        self._set_status(f'Streaming to {self._dest}', C_GREEN)
         self.btn.text = 'STOP'
         self._set_btn_col(C_RED)
         self._ui_log("Streaming!")
@@ -842,10 +1155,7 @@ try:
         DMicApp().run()
 except Exception as e:
     log(f"APP CRASHED: {e}")
-    try:
-        with open(_LOG_PATH, 'a') as f:
-            traceback.print_exc(file=f)
-    except: pass
-    traceback.print_exc()
+    log_exc()
 finally:
     log("App exited")
+    log_flush()
@@ -0,0 +1,115 @@
+"""
+Clock drift compensation for one source.
+
+A phone's ADC and the laptop's sound card each run off their own crystal,
+so their "44100 Hz" differ by up to a few hundred ppm. The jitter buffer
+releases frames at the phone's pace and the device takes them at its own,
+so the difference builds up in the source's lane: its fill creeps up
+(latency grows all day) or down (until it runs dry and restarts with a
+gap).
+
+DriftControl turns the lane's depth (Lane.slack) into a small correction
+of the source's resampling ratio. The drift is the slope of the depth
+over the last WINDOW_S, with what the correction has already taken out
+added back, so it is a measurement rather than an integral: a step in
+depth, or a spell with the correction pinned at DRIFT_MAX_PPM, cannot
+wind it up. A proportional term pulls the depth back to where it settled
+after the lane's last start over DRIFT_KP**-1 seconds. Estimates under
+DEADBAND_PPM and depth errors under TOLERANCE_S are measurement noise
+(the device reads in blocks) and are left alone, so a source whose
+clock agrees with the device's is played at exactly its own rate.
+1000 ppm is under 2 cents of pitch.
+"""
+from collections import deque
+
+from config import DRIFT_MAX_PPM
+
+DRIFT_KP = 0.2          # per second: a depth error is pulled out over ~5 s
+SMOOTH_S = 1.0          # the depth error is averaged over about this long
+SETTLE_S = 2.0          # after a (re)start the depth is averaged this long for its target
+BIN_S = 0.5             # the depth is averaged into points this far apart
+WINDOW_S = 30.0         # the drift is the depth's slope over the last this long
+MIN_SPAN_S = 10.0       # ...once the points since a start cover this much
+DEADBAND_PPM = 20       # smaller drift estimates are not acted on
+TOLERANCE_S = 0.002     # nor are smaller depth errors
+
+
+class DriftControl:
+    def __init__(self, rate, max_ppm=DRIFT_MAX_PPM):
+        self.rate = rate
+        self.max = max_ppm * 1e-6
+        self.drift = 0.0        # estimated sender clock minus device clock, fraction
+        self.correction = 0.0   # fraction of samples removed (negative: added)
+        self.removed = 0.0      # seconds of audio the correction has taken out so far
+        self._points = deque(maxlen=int(WINDOW_S / BIN_S))     # (time, uncorrected depth)
+        self.restart()
+
+    @property
+    def ppm(self):
+        return self.drift * 1e6
+
+    @property
+    def factor(self):
+        """Multiply the source's resampling ratio by this."""
+        return 1.0 - self.correction
+
+    def restart(self):
+        """The lane restarted at a new depth: settle on it afresh, keep the drift."""
+        self._points.clear()
+        self._t = None
+        self._start = None
+        self._ref = None        # settled depth, seconds
+        self._settle = [0.0, 0]
+        self._bin = [0.0, 0.0, 0]
+        self._err = 0.0
+
+    def update(self, slack, now):
+        """Feed the lane's slack (frames) at a write; returns the new factor."""
+        if self._t is None:
+            # The first write after a start lands exactly on the lead;
+            # where the depth settles is only known a few writes later.
+            self._t = self._start = now
+            return self.factor
+        dt = now - self._t
+        if dt <= 0:
+            return self.factor
+        self._t = now
+        self.removed += self.correction * dt
+        depth = slack / self.rate
+        if self._ref is None:
+            s = self._settle
+            s[0] += depth
+            s[1] += 1
+            if now - self._start < SETTLE_S:
+                self._collect(now, depth)
+                return self.factor
+            self._ref = self._err = s[0] / s[1]
+        self._err += (depth - self._err) * min(1.0, dt / SMOOTH_S)
+        self._collect(now, depth)
+        lim = self.max
+        drift = self.drift if abs(self.drift) * 1e6 >= DEADBAND_PPM else 0.0
+        err = self._err - self._ref
+        if abs(err) < TOLERANCE_S:
+            err = 0.0
+        self.correction = max(-lim, min(lim, drift + DRIFT_KP * err))
+        return self.factor
+
+    def _collect(self, now, depth):
+        # Average into a point every BIN_S, then refit the slope.
+        b = self._bin
+        b[0] += now
+        b[1] += depth + self.removed
+        b[2] += 1
+        if now - b[0] / b[2] < BIN_S / 2:
+            return
+        points = self._points
+        points.append((b[0] / b[2], b[1] / b[2]))
+        self._bin = [0.0, 0.0, 0]
+        if len(points) < 2 or points[-1][0] - points[0][0] < MIN_SPAN_S:
+            return
+        n = len(points)
+        mt = sum(p[0] for p in points) / n
+        mu = sum(p[1] for p in points) / n
+        stt = sum((p[0] - mt) ** 2 for p in points)
+        stu = sum((p[0] - mt) * (p[1] - mu) for p in points)
+        self.drift = max(-self.max, min(self.max, stu / stt))
@@ -0,0 +1,338 @@
+"""
+Per-source clean-up between decode and playout.
+
+A Chain runs a source's frames through a list of stages, each a small
+stateful object that works on a whole (n, channels) float32 block with a
+handful of numpy operations and carries its state across blocks:
+
+    highpass    2nd-order (2 x one-pole) high-pass: DC, handling and wind rumble
+    gate        closes on the hiss between words, opens at once on speech
+    agc         rides the speech level towards AGC_TARGET_DB
+    limiter     holds peaks under LIMIT_DB without clipping
+    denoise     spectral subtraction against a tracked noise floor; adds one
+                FFT window of delay (~12 ms at 44.1 kHz)
+
+Stages are named in DSP_CHAIN (config.py) or a front end's --dsp option,
+in the order they run, e.g. 'highpass,gate,denoise,agc,limiter'.
+
+Every stage's time is charged to a Budget shared by all sources, against
+the seconds of audio it processed, so report() can show what each stage
+costs as a share of one core per stream, and how many streams the chain
+would fit on a core. DSP_BUDGET_PCT is what the whole chain may use.
+"""
+import math
+import time
+
+import numpy as np
+
+from config import (AGC_MAX_GAIN_DB, AGC_TARGET_DB, DENOISE_DB, DSP_BUDGET_PCT, GATE_DB,
+                    HIGHPASS_HZ, LIMIT_DB)
+
+FULL = 32768.0
+
+
+def _gain(db):
+    return 10.0 ** (db / 20.0)
+
+
+def _level_db(x):
+    """RMS of a block in dB of full scale, loudest channel."""
+    ms = float(np.einsum('ij,ij->j', x, x).max()) / len(x)
+    return 10.0 * math.log10(ms / (FULL * FULL) + 1e-12)
+
+
+def _ramp(x, g0, g1):
+    """Scale x by a gain sliding from g0 to g1 across the block."""
+    if g0 == g1:
+        if g1 != 1.0:
+            x *= g1
+        return
+    n = len(x)
+    x *= np.linspace(g0 + (g1 - g0) / n, g1, n, dtype=np.float32)[:, None]
+
+
+class HighPass:
+    name = 'highpass'
+
+    def __init__(self, rate, hz=HIGHPASS_HZ, order=2):
+        rc = 1.0 / (2 * math.pi * hz)
+        self.a = rc / (rc + 1.0 / rate)
+        self.order = order
+        # Powers of a for the closed-form recursion, in chunks short enough
+        # that a**-n stays far from overflow.
+        self.chunk = int(min(4096, 300 / -math.log(self.a)))
+        k = np.arange(self.chunk)
+        self._up = self.a ** k
+        self._down = self.a ** (1 - k)      # a * a**-k
+        self._x = None      # per pass: last input, last output
+        self._y = None
+        self._d = None
+
+    def process(self, x):
+        c = x.shape[1]
+        if self._x is None or self._x.shape[1] != c:
+            self._x = np.zeros((self.order, c))
+            self._y = np.zeros((self.order, c))
+            self._d = np.empty((self.chunk, c))
+        for p in range(self.order):
+            for i in range(0, len(x), self.chunk):
+                self._pass(x[i:i + self.chunk], p)
+        return x
+
+    def _pass(self, x, p):
+        # y[k] = a * (y[k-1] + x[k] - x[k-1]), solved for the whole block:
+        # y[k] = a**k * (a * y[-1] + sum_j<=k a**-j * a * d[j]).
+        n = len(x)
+        d = self._d[:n]
+        d[0] = x[0] - self._x[p]
+        np.subtract(x[1:], x[:-1], out=d[1:])
+        self._x[p] = x[-1]
+        d *= self._down[:n, None]
+        np.cumsum(d, axis=0, out=d)
+        d += self.a * self._y[p]
+        d *= self._up[:n, None]
+        self._y[p] = d[-1]
+        x[:] = d
+
+
+class Gate:
+    name = 'gate'
+
+    def __init__(self, rate, open_db=GATE_DB, hysteresis_db=6.0, range_db=-30.0,
+                 hold_s=0.15, release_s=0.1):
+        self.rate = rate
+        self.open_db = open_db
+        self.close_db = open_db - hysteresis_db
+        self.floor = _gain(range_db)    # closed is quiet, not silent
+        self.hold = hold_s
+        self.release = release_s
+        self.g = 1.0
+        self._quiet = 0.0   # seconds below the close threshold
+
+    def process(self, x):
+        dt = len(x) / self.rate
+        level = _level_db(x)
+        g0 = self.g
+        if level >= self.open_db or (g0 == 1.0 and level >= self.close_db):
+            self._quiet = 0.0
+            self.g = 1.0
+        else:
+            self._quiet += dt
+            if self._quiet > self.hold:
+                # Fade down to the floor over the release time.
+                self.g = max(self.floor, g0 - (1.0 - self.floor) * dt / self.release)
+        _ramp(x, g0, self.g)
+        return x
+
+
+class AGC:
+    name = 'agc'
+
+    def __init__(self, rate, target_db=AGC_TARGET_DB, max_gain_db=AGC_MAX_GAIN_DB,
+                 min_db=GATE_DB, down_s=0.1, up_s=2.0):
+        self.rate = rate
+        self.target = target_db
+        self.max_gain = max_gain_db
+        self.min_db = min_db        # quieter than this is not speech: hold the gain
+        self.down = down_s
+        self.up = up_s
+        self.gain_db = 0.0
+
+    def process(self, x):
+        dt = len(x) / self.rate
+        level = _level_db(x)
+        g0 = _gain(self.gain_db)
+        if level > self.min_db:
+            want = max(-self.max_gain, min(self.max_gain, self.target - level))
+            tau = self.down if want < self.gain_db else self.up
+            self.gain_db += (want - self.gain_db) * min(1.0, dt / tau)
+        _ramp(x, g0, _gain(self.gain_db))
+        return x
+
+
+class Limiter:
+    name = 'limiter'
+
+    def __init__(self, rate, ceiling_db=LIMIT_DB, attack_s=0.001, release_s=0.08):
+        self.rate = rate
+        self.ceiling = FULL * _gain(ceiling_db)
+        self.attack = max(1, int(rate * attack_s))
+        self.release = release_s
+        self.g = 1.0
+
+    def process(self, x):
+        n = len(x)
+        peak = float(max(x.max(), -x.min()))
+        g0 = self.g
+        if peak * g0 > self.ceiling:
+            # Fast attack over the first millisecond; the clip below
+            # catches a peak inside it.
+            g1 = self.ceiling / peak
+            m = min(n, self.attack)
+            _ramp(x[:m], g0, g1)
+            if n > m:
+                x[m:] *= g1
+            self.g = g1
+        else:
+            # Release, but not so far that this block's peak goes over.
+            self.g = min(g0 + (1.0 - g0) * min(1.0, n / self.rate / self.release),
+                         self.ceiling / peak if peak else 1.0)
+            _ramp(x, g0, self.g)
+        np.clip(x, -self.ceiling, self.ceiling, out=x)
+        return x
+
+
+class Denoise:
+    name = 'denoise'
+
+    def __init__(self, rate, depth_db=DENOISE_DB, window_ms=10.0, over=2.0, rise_db_s=3.0):
+        self.size = 1 << max(6, round(math.log2(rate * window_ms / 1000)))
+        self.hop = self.size // 2
+        self.delay = self.size      # samples between input and output
+        # sqrt-Hann analysis and synthesis windows overlap-add to 1 at 50%.
+        self.win = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.size) / self.size))
+        self.floor = _gain(-depth_db)
+        self.over = over
+        self.rise = 10.0 ** (rise_db_s * self.hop / rate / 10.0)     # per hop, power
+        self._in = None
+        self._out = None
+        self._tail = None
+        self._noise = None
+        self._g = None
+
+    def _start(self, c):
+        bins = self.hop + 1
+        self._in = np.zeros((self.hop, c), dtype=np.float32)
+        self._out = np.zeros((self.hop, c), dtype=np.float32)
+        self._tail = np.zeros((c, self.hop))
+        self._noise = None
+        self._g = np.ones((c, bins))
+
+    def process(self, x):
+        n, c = x.shape
+        if self._in is None or self._in.shape[1] != c:
+            self._start(c)
+        buf = np.concatenate((self._in, x))
+        hop, size = self.hop, self.size
+        k = (len(buf) - hop) // hop
+        if k:
+            # (k, c, size) windows, hop apart, transformed in one call.
+            frames = np.lib.stride_tricks.sliding_window_view(buf, size, axis=0)[::hop][:k]
+            spec = np.fft.rfft(frames * self.win, axis=-1)
+            power = spec.real ** 2 + spec.imag ** 2
+            gains = np.empty(power.shape)
+            for i in range(k):
+                gains[i] = self._hop_gain(power[i])
+            out = np.fft.irfft(spec * gains, n=size, axis=-1) * self.win
+            # Each hop of output is one window's first half plus the previous one's second.
+            done = out[:, :, :hop].copy()
+            done[0] += self._tail
+            done[1:] += out[:-1, :, hop:]
+            self._tail = out[-1, :, hop:]
+            self._out = np.concatenate((self._out, done.transpose(0, 2, 1).reshape(-1, c)))
+        self._in = buf[k * hop:]
+        x[:] = self._out[:n]
+        self._out = self._out[n:]
+        return x
+
+    def _hop_gain(self, p):
+        noise = self._noise
+        if noise is None:
+            noise = self._noise = p.copy()
+        # Bins near the floor are averaged into it; louder ones (speech)
+        # only let it creep up, so a noisier room is learnt within seconds
+        # but talking does not raise it.
+        quiet = p < 3.0 * noise
+        noise *= np.where(quiet, 1.0, self.rise)
+        noise += np.where(quiet, (p - noise) * 0.1, 0.0)
+        g = np.maximum(self.floor, 1.0 - self.over * noise / (p + 1e-9))
+        # Open at once, close halfway per hop: less "musical" noise.
+        self._g = np.maximum(g, 0.5 * (self._g + g))
+        return self._g
+
+
+STAGES = {cls.name: cls for cls in (HighPass, Gate, AGC, Limiter, Denoise)}
+
+
+def parse(spec):
+    """Stage names from 'highpass,agc,...' ('' or 'none' for no stages)."""
+    names = [s.strip() for s in (spec or '').split(',') if s.strip()]
+    if names == ['none']:
+        return []
+    for name in names:
+        if name not in STAGES:
+            raise ValueError(f"Unknown DSP stage: {name} (choose from {', '.join(STAGES)})")
+    return names
+
+
+class Budget:
+    """CPU time per stage, against the seconds of audio it processed."""
+
+    def __init__(self, limit_pct=DSP_BUDGET_PCT):
+        self.limit = limit_pct
+        self.stages = {}        # name -> [calls, ns, audio seconds]
+        self.since = time.monotonic()
+
+    def add(self, name, ns, seconds):
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = [0, 0, 0.0]
+        st[0] += 1
+        st[1] += ns
+        st[2] += seconds
+
+    def share(self, name=None):
+        """Percent of one core per stream, for one stage or the whole chain."""
+        rows = [self.stages[name]] if name else list(self.stages.values())
+        audio = max((st[2] for st in rows), default=0.0)
+        return 100.0 * sum(st[1] for st in rows) / 1e9 / audio if audio else 0.0
+
+    def report(self):
+        span = time.monotonic() - self.since
+        lines = [f"── DSP budget, {span:.1f}s ──",
+                 f"{'stage':<12}{'calls':>9}{'mean us':>10}{'% core':>9}{'of budget':>11}"]
+        for name, (calls, ns, _) in list(self.stages.items()):
+            pct = self.share(name)
+            lines.append(f"{name:<12}{calls:>9}{ns / calls / 1e3:>10.1f}{pct:>9.2f}"
+                         f"{100 * pct / self.limit:>10.0f}%")
+        total = self.share()
+        if self.stages:
+            streams = f"{100 / total:.0f}" if total else "many"
+            lines.append(f"{'total':<12}{'':>9}{'':>10}{total:>9.2f}"
+                         f"{100 * total / self.limit:>10.0f}%   ~{streams} streams per core"
+                         + ("   OVER BUDGET" if total > self.limit else ""))
+        return '\n'.join(lines)
+
+
+class Chain:
+    def __init__(self, spec, rate, budget=None):
+        self.stages = [STAGES[name](rate) for name in parse(spec)]
+        self.rate = rate
+        self.budget = budget if budget is not None else Budget()
+        self._buf = None
+
+    def __bool__(self):
+        return bool(self.stages)
+
+    @property
+    def delay(self):
+        """Seconds the chain holds audio back."""
+        return sum(getattr(st, 'delay', 0) for st in self.stages) / self.rate
+
+    def process(self, frame):
+        """Run one (n, channels) block; the result is valid until the next call."""
+        n, c = frame.shape
+        buf = self._buf
+        if buf is None or len(buf) < n or buf.shape[1] != c:
+            buf = self._buf = np.empty((n, c), dtype=np.float32)
+        x = buf[:n]
+        x[:] = frame
+        seconds = n / self.rate
+        add, clock = self.budget.add, time.perf_counter_ns
+        t = clock()
+        for st in self.stages:
+            x = st.process(x)
+            now = clock()
+            add(st.name, now - t, seconds)
+            t = now
+        return x
@@ -0,0 +1,418 @@
+"""
+D-MIC receive engine: per-source stream state and the mixed output.
+
+The engine knows nothing about sockets or windows. A front end feeds it
+datagrams with handle() (sending back whatever reply it returns) and
+calls service() at least every JITTER_POLL_MS to move due audio into the
+mix. The Tk window in server.py and the console receiver in headless.py
+are the two front ends; both drive it through receiver.py's event loop.
+
+Each sender becomes a Source, keyed by its SSRC (or by address for
+headerless senders), with its own jitter buffer, concealment, FEC,
+meter, gain and mute. All sources are mixed into one Playout stream
+whose format is taken from the first source, capped at MAX_CHANNELS,
+unless the front end fixes it. Sources at a different rate are resampled
+onto it; extra channels are dropped at decode time, which for planar
+payloads means never decoding them. With DRIFT_CORRECT every source is
+resampled, by a ratio drift.py trims so the sender's clock and the sound
+card's cannot walk its depth away. Before that, each source's audio can
+run through its own dsp.Chain (DSP_CHAIN, empty by default: high-pass,
+gate, AGC, limiter, noise suppression), whose cost is charged to the
+engine's dsp_budget.
+"""
+import time
+
+import codec
+import dsp
+import profiler
+import protocol
+from config import *
+from drift import DriftControl
+from fec import ParityDecoder
+from jitter import JitterBuffer
+from meter import Meter
+from metrics import DECODE_BUCKETS, Histogram
+from playout import Playout, SinkPlayout
+from plc import Concealer
+from resample import Resampler
+
+
+class Source:
+    def __init__(self, key, addr, hdr, lane, out_rate, min_delay=JITTER_MIN_MS / 1000.0,
+                 prof=profiler.OFF, drift=DRIFT_CORRECT, chain=None):
+        self.key = key
+        self.addr = addr
+        self.ssrc = hdr.ssrc
+        self.rate = hdr.rate
+        self.channels = hdr.channels
+        self.flags = hdr.flags
+        self.planar = bool(hdr.flags & protocol.FLAG_PLANAR)
+        self.stamped = bool(hdr.flags & protocol.FLAG_STAMP)
+        self.keep = min(hdr.channels, MAX_CHANNELS)
+        self.fmt = hdr.fmt
+        # Conceal for time, not frames, so 5 ms frames still reach the end of the fade.
+        self.jb = JitterBuffer(hdr.rate, min_delay,
+                               max_conceal=max(MAX_CONCEAL_MS, PLC_FADE_MS) / 1000.0)
+        self.min_delay = min_delay
+        self.plc = Concealer(hdr.rate)
+        self.fec = ParityDecoder(hdr.rate)
+        self.meter = Meter()
+        self.dsp = chain or None        # a dsp.Chain with at least one stage
+        self.lane = lane
+        self.out_rate = out_rate
+        self.ratio = out_rate / hdr.rate
+        self.resampler = Resampler(self.ratio) if drift or out_rate != hdr.rate else None
+        self.drift = DriftControl(out_rate) if drift else None
+        self._starts = 0
+        self.gain = 1.0
+        self.muted = False
+        self.closing = False
+        self.last_seen = self.first_seen = time.monotonic()
+        # Counters for metrics.py; only this source's receive path writes them.
+        self.packets = 0
+        self.bytes = 0
+        self.reordered = 0
+        self.malformed = 0
+        self.decode_time = Histogram(DECODE_BUCKETS)
+        self.prof = prof
+        self._top_seq = None
+        # Latency breakdown for stamped streams. offset/rtt come from the
+        # sender's PINGs (ns); delay is (network, buffer) in seconds,
+        # smoothed, published as one tuple like Meter.level.
+        self.offset = None
+        self.rtt = None
+        self.delay = None
+        self._arrived = {}
+        # Receiver reports: when the next is due, and the counters at the last.
+        self._report_at = None
+        self._reported = (0, 0, 0, 0)
+        # Decoded frames live in arrays recycled once they are mixed, so
+        # the payload (a view of the socket's receive buffer) is never kept
+        # and steady streaming allocates no frame memory.
+        self._spare = []
+
+    @property
+    def name(self):
+        return f"{self.addr[0]}:{self.addr[1]}"
+
+    def push(self, seq, ts, payload):
+        if self.fmt not in protocol.FMT_NAMES:
+            self.malformed += 1
+            return
+        now = time.monotonic()
+        net = None
+        if self.stamped:
+            if len(payload) < protocol.STAMP.size:
+                self.malformed += 1
+                return
+            if self.offset is not None:
+                captured = (protocol.STAMP.unpack_from(payload)[0] + self.offset) / 1e9
+                net = now - captured    # capture to arrival, one frame of packetizing included
+            payload = payload[protocol.STAMP.size:]
+        t = time.perf_counter_ns()
+        spare = self._spare.pop() if self._spare else None
+        try:
+            frame = codec.decode(self.fmt, payload, self.channels, self.planar, self.keep, spare)
+        except ValueError:
+            self.malformed += 1
+            return      # truncated or corrupt payload
+        if not len(frame):
+            self.malformed += 1     # PLC and the meter need at least one sample
+            if frame is spare:
+                self._spare.append(spare)
+            return
+        if frame is not spare and (self.fmt == protocol.FMT_PCM16 or not frame.flags.c_contiguous):
+            # New frame size, or the pool is still filling. pcm16 is a view
+            # of the receive buffer; ulaw and ulaw4 decode into a fresh array,
+            # kept as is unless it is a strided slice a later decode cannot fill.
+            frame = frame.copy()
+        self.decode_time.observe((time.perf_counter_ns() - t) * 1e-9)
+        t = self.prof.lap('decode', t)
+        if self._top_seq is None or seq > self._top_seq:
+            self._top_seq = seq
+        elif seq < self._top_seq:
+            self.reordered += 1
+        if not self.jb.push(seq, ts, frame, now):
+            self._spare.append(frame)
+        elif net is not None:
+            if len(self._arrived) > 256:
+                self._arrived.clear()
+            self._arrived[seq] = (now, net)
+        self.prof.lap('jb_push', t)
+
+    def _track(self, now):
+        # Steer the next frame's resampling ratio by where this one landed.
+        lane, drift = self.lane, self.drift
+        if lane.starts != self._starts:
+            self._starts = lane.starts
+            drift.restart()
+        # Raising the jitter target holds releases back, and drains the
+        # lane, by just as long; add it back so only the clocks differ.
+        slack = lane.slack + self.jb.target * self.out_rate
+        self.resampler.ratio = self.ratio * drift.update(slack, now)
+
+    def report(self, now, interval):
+        """A KIND_REPORT datagram for the sender once per `interval`, else None."""
+        if self._report_at is None:
+            self._report_at = now + interval
+        if now < self._report_at:
+            return None
+        self._report_at = now + interval
+        jb = self.jb
+        counts = (jb.received, jb.lost, jb.late, self.fec.recovered)
+        got, lost, late, rebuilt = (a - b for a, b in zip(counts, self._reported))
+        self._reported = counts
+        due = max(1, got + lost + late)
+        return protocol.pack(protocol.KIND_REPORT, self.fmt, self.channels, 0, self.ssrc,
+                             self._top_seq or 0, 0, self.rate) + \
+            protocol.REPORT.pack(min(1000, (lost + rebuilt) * 1000 // due),
+                                 lost * 1000 // due, late * 1000 // due,
+                                 min(int(jb.jitter * 1e6), 0xFFFFFFFF),
+                                 min(int(jb.target * 1e6), 0xFFFFFFFF),
+                                 min(jb.depth, 0xFFFF), self._top_seq or 0)
+
+    def clock(self, offset, rtt):
+        """Sender's clock offset (server minus sender) and RTT, in ns."""
+        self.offset, self.rtt = offset, rtt
+
+    def receive(self, hdr, payload):
+        self.last_seen = time.monotonic()
+        self.packets += 1
+        self.bytes += protocol.HEADER.size + len(payload)
+        self.fmt = hdr.fmt
+        rebuilt = None
+        if hdr.kind == protocol.KIND_AUDIO:
+            self.push(hdr.seq, hdr.ts, payload)
+            rebuilt = self.fec.add_frame(hdr.seq, hdr.ts, payload)
+            if not self.fec.group and self.jb.min_delay != self.min_delay:
+                # Parity stopped: stop waiting for it.
+                self.jb.min_delay = self.min_delay
+        elif hdr.kind == protocol.KIND_FEC:
+            rebuilt = self.fec.add_parity(hdr.seq, payload)
+            # Hold frames long enough for their group's parity to land.
+            jb = self.jb
+            jb.min_delay = self.min_delay + self.fec.group * jb.frame_len / jb.rate
+        elif hdr.kind == protocol.KIND_BYE:
+            self.closing = True
+        if rebuilt:
+            self.push(*rebuilt)
+
+    def service(self, now):
+        # Release frames on their deadline; the lane already leads the
+        # device by a cushion. Releasing earlier than the jitter target
+        # would declare frames lost before they could have arrived.
+        prof = self.prof
+        t = prof.start()
+        due = self.jb.pop(now)
+        t = prof.lap('jb_pop', t)
+        for seq, frame in due:
+            if seq in self._arrived:
+                arrived, net = self._arrived.pop(seq)
+                # The frame's first sample leaves the ring after what the
+                # lane has queued ahead of it.
+                buf = now + self.lane.fill / self.out_rate - arrived
+                if self.dsp:
+                    buf += self.dsp.delay
+                d = self.delay or (net, buf)
+                self.delay = (d[0] + (net - d[0]) / 16, d[1] + (buf - d[1]) / 16)
+            held = frame
+            if frame is None:
+                frame = self.plc.conceal(self.jb.frame_len, self.keep)
+            else:
+                frame = self.plc.good(frame)
+            t = prof.lap('plc', t)
+            if self.dsp:
+                frame = self.dsp.process(frame)
+                t = prof.lap('dsp', t)
+            self.meter.update(frame)
+            t = prof.lap('meter', t)
+            if not self.muted:
+                if self.resampler:
+                    frame = self.resampler.process(frame)
+                    t = prof.lap('resample', t)
+                self.lane.write(frame, self.gain)
+                t = prof.lap('mix', t)
+                if self.drift:
+                    self._track(now)
+            if held is not None:
+                self._spare.append(held)    # the mix copied it; reuse the array
+
+
+class ReceiverEngine:
+    def __init__(self, device=None, timeout=SOURCE_TIMEOUT_S, rate=None, channels=None,
+                 min_delay_ms=JITTER_MIN_MS, buffer_ms=PLAYOUT_BUFFER_MS, sink=None,
+                 prof=profiler.OFF, cushion_ms=PLAYOUT_CUSHION_MS,
+                 report_interval=REPORT_INTERVAL_S, drift=DRIFT_CORRECT, dsp_chain=DSP_CHAIN):
+        self.device = device
+        self.prof = prof        # a profiler.Profiler to time decode/PLC/mix stages
+        # None plays to the sound card; 'null' or a .wav path uses a
+        # clock-driven SinkPlayout instead.
+        self.sink = sink
+        self.timeout = timeout
+        # A fixed output format (rate and/or channels) is opened once and
+        # kept; otherwise it follows the first source.
+        self.rate = rate
+        self.channels = channels
+        self.min_delay = min_delay_ms / 1000.0
+        self.buffer_ms = buffer_ms
+        self.cushion_ms = cushion_ms
+        self.report_interval = report_interval
+        self.drift = drift
+        self.dsp_chain = ','.join(dsp.parse(dsp_chain))    # fails early on a typo
+        self.dsp_budget = dsp.Budget()      # CPU per DSP stage, all sources together
+        self.sources = {}
+        self.playout = None
+        self.device_error = None    # why the output last failed to open, until it opens
+        self._open_failed = 0.0
+        # Headerless senders get arrival-order sequence numbers and the
+        # configured rate/channels, tracked per address.
+        self._legacy = {}
+        # Counters for metrics.py, written only by the receive thread.
+        self.started = time.monotonic()
+        self.packets = 0
+        self.bytes = 0
+        self.malformed = 0
+        self.sources_total = 0
+
+    @property
+    def underruns(self):
+        return self.playout.underruns if self.playout else 0
+
+    @property
+    def overruns(self):
+        return self.playout.overruns if self.playout else 0
+
+    @property
+    def device_latency(self):
+        """Output latency the sound card reports, in seconds."""
+        return self.playout.latency if self.playout else 0.0
+
+    def latency(self, src):
+        """(network, buffer, device) delay of a stamped source in seconds, or None."""
+        if src.delay is None:
+            return None
+        return src.delay + (self.device_latency,)
+
+    def level(self):
+        """Meter tuple of the loudest source, for a master VU display."""
+        levels = [s.meter.level for s in list(self.sources.values()) if not s.muted]
+        return max(levels, default=(0.0, 0.0, 0.0))
+
+    def _open(self, rate, channels):
+        """Open the output; False (and device_error set) if the device refused."""
+        now = time.monotonic()
+        if self.device_error and now - self._open_failed < DEVICE_RETRY_S:
+            return False    # not on every datagram: opening a device is slow
+        if self.playout:
+            self.playout.close()
+            self.playout = None
+        if self.sink:
+            path = None if self.sink == 'null' else self.sink
+            # Sink blocks no longer than half the cushion, like a low-latency device.
+            block = min(256, max(32, int(rate * self.cushion_ms / 2000)))
+            playout = SinkPlayout(rate, channels, path, block, buffer_ms=self.buffer_ms,
+                                  cushion_ms=self.cushion_ms)
+            playout.start()
+        else:
+            try:
+                playout = Playout(rate, channels, device=self.device, buffer_ms=self.buffer_ms,
+                                  cushion_ms=self.cushion_ms)
+                playout.start()
+            except Exception as e:      # sounddevice.PortAudioError, or ValueError for a bad device
+                self.device_error = str(e) or type(e).__name__
+                self._open_failed = now
+                return False
+        self.playout = playout
+        self.device_error = None
+        return True
+
+    def _legacy_header(self, data, addr):
+        # Headerless senders predate stereo: always mono, whatever CHANNELS says.
+        seq, ts = self._legacy.get(addr, (0, 0))
+        self._legacy[addr] = (seq + 1, ts + len(data) // 2)
+        return protocol.Header(protocol.KIND_AUDIO, protocol.FMT_PCM16, 1, 0,
+                               0, seq, ts, RATE)
+
+    def handle(self, data, addr):
+        """Process one datagram. Returns a reply datagram for `addr`, or None."""
+        self.packets += 1
+        self.bytes += len(data)
+        pkt = protocol.parse(data)
+        if pkt is None:
+            hdr, payload, key = self._legacy_header(data, addr), data, addr
+        else:
+            (hdr, payload), key = pkt, pkt[0].ssrc
+            if not protocol.sane(hdr):
+                # A bogus rate or channel count would reach _open() and Source.
+                self.malformed += 1
+                return None
+
+        reply = None
+        if hdr.kind == protocol.KIND_PING:
+            # Answer first and fast: the reply time goes into the sender's RTT.
+            t2 = time.monotonic_ns()
+            if len(payload) < protocol.PING.size:
+                self.malformed += 1
+                return None
+            t1, offset, rtt = protocol.PING.unpack_from(payload)
+            src = self.sources.get(key)
+            if src is not None and rtt >= 0:
+                src.clock(offset, rtt * 1000)
+            return protocol.pack(protocol.KIND_PONG, hdr.fmt, hdr.channels, 0, hdr.ssrc,
+                                 hdr.seq, hdr.ts, hdr.rate) + \
+                protocol.PONG.pack(t1, t2, time.monotonic_ns())
+        if hdr.kind == protocol.KIND_HELLO:
+            # The ACK carries the channels we will play; the sender drops the rest.
+            reply = protocol.pack(protocol.KIND_HELLO_ACK, hdr.fmt,
+                                  min(hdr.channels, self.channels or MAX_CHANNELS), 0,
+                                  hdr.ssrc, hdr.seq, hdr.ts, hdr.rate)
+
+        src = self.sources.get(key)
+        if src is not None and (hdr.rate, hdr.channels, hdr.flags) != \
+                (src.rate, src.channels, src.flags):
+            del self.sources[key]           # sender changed format: start over
+            src = None
+        if src is None:
+            if hdr.kind not in (protocol.KIND_HELLO, protocol.KIND_AUDIO):
+                return reply
+            rate = self.rate or hdr.rate
+            channels = self.channels or min(hdr.channels, MAX_CHANNELS)
+            if self.playout is None or not self.sources and \
+                    (rate, channels) != (self.playout.rate, self.playout.channels):
+                if not self._open(rate, channels):
+                    return reply    # device_error says why; the front end shows it
+            chain = dsp.Chain(self.dsp_chain, hdr.rate, self.dsp_budget)
+            src = Source(key, addr, hdr, self.playout.lane(), self.playout.rate, self.min_delay,
+                         self.prof, self.drift, chain)
+            self.sources[key] = src
+            self.sources_total += 1
+        src.receive(hdr, payload)
+        if reply is None and pkt is not None and self.report_interval:
+            # Reports ride back as the reply to audio, on the socket it came in on.
+            reply = src.report(src.last_seen, self.report_interval)
+        return reply
+
+    def service(self, now=None):
+        """Play out everything due and retire sources that went away."""
+        if now is None:
+            now = time.monotonic()
+        for key, src in list(self.sources.items()):
+            src.service(now)
+            if (src.closing and not src.jb.depth) or now - src.last_seen > self.timeout:
+                del self.sources[key]
+                self._legacy.pop(key, None)
+
+    def set_gain(self, key, gain):
+        if key in self.sources:
+            self.sources[key].gain = gain
+
+    def set_mute(self, key, muted):
+        if key in self.sources:
+            self.sources[key].muted = muted
+
+    def close(self):
+        self.sources.clear()
+        self._legacy.clear()
+        if self.playout:
+            self.playout.close()
+            self.playout = None
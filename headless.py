@@ -0,0 +1,209 @@
+"""
+D-MIC receiver without a window.
+
+Runs the same ReceiverEngine as server.py from a console, for machines
+with no display (e.g. a rack box feeding a recording chain). Tkinter is
+never imported. One asyncio loop (receiver.py) serves every port given.
+Stops cleanly on Ctrl+C or SIGTERM and prints a stats line to stdout
+every few seconds.
+
+    python headless.py --port 50005 --device 3 --buffer-ms 40 --rate 48000 --channels 2
+    python headless.py --port 50005,50006,50007 --sink null
+"""
+import argparse
+import signal
+import socket
+import sys
+import time
+
+import profiler
+import protocol
+from config import *
+
+
+def port_list(text):
+    ports = [int(x) for x in text.split(',') if x.strip()]
+    if not ports:
+        raise argparse.ArgumentTypeError("at least one port is needed")
+    for port in ports:
+        if not 0 <= port < 65536:
+            raise argparse.ArgumentTypeError(f"port out of range: {port}")
+    return ports
+
+
+def metrics_spec(text):
+    """[HOST:]PORT -> (host, port)."""
+    host, _, port = text.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a port: {port!r}")
+    if not 0 <= port < 65536:
+        raise argparse.ArgumentTypeError(f"port out of range: {port}")
+    return host or METRICS_HOST, port
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Headless D-MIC receiver")
+    p.add_argument('--port', type=port_list, default=[PORT],
+                   help=f"UDP port, or a comma-separated list; 0 picks a free one (default {PORT})")
+    p.add_argument('--device', default=None,
+                   help="output device index or name substring (default: system output)")
+    p.add_argument('--sink', default=None, metavar='null|FILE.wav',
+                   help="discard the audio or write it to a WAV file instead of a device")
+    p.add_argument('--list-devices', action='store_true', help="print output devices and exit")
+    p.add_argument('--buffer-ms', type=float, default=None,
+                   help=f"minimum jitter buffer depth (default {JITTER_MIN_MS}, "
+                        f"{LL_JITTER_MIN_MS} with --low-latency)")
+    p.add_argument('--ring-ms', type=int, default=PLAYOUT_BUFFER_MS,
+                   help=f"playout ring capacity (default {PLAYOUT_BUFFER_MS})")
+    p.add_argument('--rate', type=int, default=None,
+                   help="fixed output sample rate (default: first sender's rate)")
+    p.add_argument('--channels', type=int, default=None,
+                   help="fixed output channel count (default: first sender's, max "
+                        f"{MAX_CHANNELS})")
+    p.add_argument('--low-latency', action='store_true', default=LOW_LATENCY,
+                   help=f"shallow buffers for {LL_FRAME_MS} ms senders: {LL_CUSHION_MS} ms "
+                        f"playout cushion, {LL_POLL_MS} ms service tick")
+    p.add_argument('--metrics', type=metrics_spec, default=None, metavar='[HOST:]PORT',
+                   help="serve Prometheus /metrics and /metrics.json "
+                        f"(default {METRICS_HOST}:{METRICS_PORT or 'off'})")
+    p.add_argument('--dsp', default=DSP_CHAIN, metavar='STAGE,...',
+                   help="clean-up per source, in order: highpass, gate, agc, limiter, denoise; "
+                        f"'none' plays raw (default {DSP_CHAIN or 'none'}). The CPU each "
+                        "stage takes is reported on SIGUSR1 and at exit")
+    p.add_argument('--profile', action='store_true',
+                   help="time each loop stage; report on SIGUSR1 and at exit")
+    p.add_argument('--stats', type=float, default=5.0,
+                   help="seconds between stats lines, 0 = quiet (default 5)")
+    args = p.parse_args(argv)
+    if args.buffer_ms is None:
+        args.buffer_ms = LL_JITTER_MIN_MS if args.low_latency else JITTER_MIN_MS
+    if args.device is not None and args.device.isdigit():
+        args.device = int(args.device)
+    return args
+
+
+def latency_text(lat, rtt):
+    if not lat:
+        return ""
+    net, buf, dev = (x * 1000 for x in lat)
+    text = f" m2e={net + buf + dev:.1f}ms (net={net:.1f} buf={buf:.1f} dev={dev:.1f}"
+    if rtt is not None:
+        text += f" rtt={rtt / 1e6:.1f}"
+    return text + ")"
+
+
+def packet_text(src):
+    """Frame duration and the packet rate achieved since the source appeared."""
+    span = time.monotonic() - src.first_seen
+    frame_ms = src.jb.frame_len * 1000 / src.rate
+    return f"{frame_ms:.1f}ms@{src.packets / span if span > 0 else 0:.0f}/s"
+
+
+def stats_line(engine):
+    parts = [time.strftime('%H:%M:%S'), f"sources={len(engine.sources)}",
+             f"underruns={engine.underruns}", f"overruns={engine.overruns}"]
+    if engine.device_error:
+        parts.append(f"device_error={engine.device_error!r}")
+    for src in list(engine.sources.values()):
+        jb = src.jb
+        parts.append(f"[{src.name} {src.rate}Hz x{src.channels} "
+                     f"{protocol.FMT_NAMES.get(src.fmt, '?')} {packet_text(src)} "
+                     f"delay={jb.target * 1000:.0f}ms lost={jb.lost} late={jb.late} "
+                     f"fec={src.fec.recovered} peak={src.meter.level[0]:.2f}"
+                     f"{f' drift={src.drift.ppm:+.0f}ppm' if src.drift else ''}"
+                     f"{latency_text(engine.latency(src), src.rtt)}]")
+    return ' '.join(parts)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list_devices:
+        import sounddevice as sd
+        print(sd.query_devices())
+        return 0
+
+    from engine import ReceiverEngine
+    from receiver import AsyncReceiver
+
+    socks = []
+    for port in args.port:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        socks.append(sock)
+        try:
+            sock.bind(('', port))
+        except OSError as e:
+            print(f"Failed to bind port {port}: {e}", file=sys.stderr)
+            for sock in socks:
+                sock.close()
+            return 1
+        got = protocol.set_rcvbuf(sock, RCVBUF_BYTES)
+        if got < RCVBUF_BYTES:
+            print(f"Port {port}: socket receive buffer capped at {got // 1024} KB "
+                  f"(wanted {RCVBUF_BYTES // 1024} KB)", file=sys.stderr)
+
+    prof = profiler.get('receiver', True if args.profile or PROFILE else None)
+    try:
+        engine = ReceiverEngine(device=args.device, rate=args.rate, channels=args.channels,
+                                min_delay_ms=args.buffer_ms, buffer_ms=args.ring_ms,
+                                sink=args.sink, prof=prof,
+                                cushion_ms=LL_CUSHION_MS if args.low_latency else PLAYOUT_CUSHION_MS,
+                                dsp_chain=args.dsp)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        for sock in socks:
+            sock.close()
+        return 1
+    metrics = None
+    spec = args.metrics or ((METRICS_HOST, METRICS_PORT) if METRICS_PORT else None)
+    if spec:
+        from metrics import MetricsServer
+        host, port = spec
+        try:
+            metrics = MetricsServer(engine, port, host).start()
+        except OSError as e:
+            print(f"Failed to serve metrics on {host}:{port}: {e}", file=sys.stderr)
+            engine.close()
+            for sock in socks:
+                sock.close()
+            return 1
+        print(f"Metrics on http://{host}:{metrics.port}/metrics", flush=True)
+
+    rx = AsyncReceiver(engine, socks, prof,
+                       (LL_POLL_MS if args.low_latency else JITTER_POLL_MS) / 1000.0)
+    if args.stats:
+        rx.every(args.stats, lambda: print(stats_line(engine), flush=True))
+
+    def stop(signum, frame):
+        rx.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    def reports():
+        budget = engine.dsp_budget
+        return [r for r in (prof.report(), budget.stages and budget.report()) if r]
+
+    if (prof.enabled or engine.dsp_chain) and hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1,
+                      lambda signum, frame: rx.call(lambda: print('\n'.join(reports()), flush=True)))
+
+    ports = ','.join(str(sock.getsockname()[1]) for sock in socks)
+    print(f"D-MIC listening on {get_local_ip()}:{ports}", flush=True)
+    try:
+        rx.run()
+    finally:
+        if reports():
+            print('\n'.join(reports()), flush=True)
+        if metrics:
+            metrics.close()
+        engine.close()
+        for sock in socks:
+            sock.close()
+        print("D-MIC stopped", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
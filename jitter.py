@@ -0,0 +1,130 @@
+"""
+Adaptive jitter buffer for the D-MIC receive path.
+
+Frames are keyed by sequence number and released on a playout deadline:
+their nominal capture time (sample timestamp / rate) plus a target delay.
+The target follows the measured inter-arrival jitter (RFC 3550 style
+estimator), so the buffer stays as shallow as the network allows. Frames
+that turn up after their slot has been played are dropped, never queued.
+"""
+import time
+
+from config import JITTER_MIN_MS, JITTER_MAX_MS, JITTER_MULT, MAX_CONCEAL_MS
+
+
+class JitterBuffer:
+    def __init__(self, rate, min_delay=JITTER_MIN_MS / 1000.0,
+                 max_delay=JITTER_MAX_MS / 1000.0, mult=JITTER_MULT,
+                 max_conceal=MAX_CONCEAL_MS / 1000.0):
+        self.rate = rate
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.mult = mult
+        self.max_conceal = max_conceal    # seconds of lost slots filled in a row
+        self.reset()
+
+    def reset(self):
+        self._frames = {}
+        self._base_ts = None
+        self.next_seq = None
+        self.frame_len = 0
+        self.jitter = 0.0          # smoothed inter-arrival jitter (s)
+        self.target = self.min_delay
+        self.received = 0
+        self.late = 0
+        self.lost = 0
+        self.duplicates = 0
+
+    def _anchor(self, seq, ts, now):
+        self._frames.clear()
+        self._base_ts = ts
+        self._base_time = now
+        self._floor = 0.0          # earliest transit offset seen (s)
+        self._last_offset = None
+        self._next_ts = ts
+        self._misses = 0
+        self.next_seq = seq
+
+    @property
+    def depth(self):
+        """Frames currently held."""
+        return len(self._frames)
+
+    def push(self, seq, ts, frame, now=None):
+        """Queue a frame. Returns False if it was late or a duplicate."""
+        if now is None:
+            now = time.monotonic()
+        span = 4 * self.rate // max(1, len(frame))   # ~4 s worth of frames
+        if self._base_ts is None or abs(seq - self.next_seq) > span:
+            # First frame, or the sender jumped: re-anchor the timeline.
+            self._anchor(seq, ts, now)
+
+        offset = now - self._base_time - (ts - self._base_ts) / self.rate
+        if self._last_offset is not None:
+            d = abs(offset - self._last_offset)
+            self.jitter += (d - self.jitter) / 16.0
+        self._last_offset = offset
+        self.frame_len = len(frame)
+        # The floor tracks the fastest path; let it creep up slowly so
+        # a sender clock that runs slow does not turn every frame late.
+        creep = self.frame_len / self.rate * 0.001
+        self._floor = min(offset, self._floor + creep)
+        self._adapt()
+
+        if seq < self.next_seq:
+            self.late += 1
+            return False
+        if seq in self._frames:
+            self.duplicates += 1
+            return False
+        self._frames[seq] = (ts, frame)
+        self.received += 1
+        return True
+
+    def _adapt(self):
+        want = min(self.max_delay, max(self.min_delay, self.jitter * self.mult))
+        if want > self.target:
+            self.target = want
+        else:
+            # Shrink slowly so a single quiet spell does not cause a gap.
+            self.target += (want - self.target) * 0.01
+
+    def _deadline(self, ts):
+        return (self._base_time + self._floor + self.target
+                + (ts - self._base_ts) / self.rate)
+
+    def pop(self, now=None):
+        """
+        Release every frame whose deadline has passed, in sequence order.
+        Returns [(seq, frame)]; frame is None for a slot that never arrived.
+        """
+        if self.next_seq is None:
+            return []
+        if now is None:
+            now = time.monotonic()
+        out = []
+        while True:
+            item = self._frames.get(self.next_seq)
+            ts = item[0] if item else self._next_ts
+            if now < self._deadline(ts):
+                break
+            seq = self.next_seq
+            self.next_seq += 1
+            if item:
+                del self._frames[seq]
+                self._misses = 0
+                self._next_ts = ts + len(item[1])
+                out.append((seq, item[1]))
+            else:
+                self.lost += 1
+                self._misses += 1
+                self._next_ts = ts + self.frame_len
+                if self._misses * self.frame_len <= self.max_conceal * self.rate:
+                    out.append((seq, None))
+                elif not self._frames:
+                    # Stream went quiet: stop inventing slots.
+                    self.next_seq = seq
+                    self._next_ts = ts
+                    self.lost -= 1
+                    break
+        return out
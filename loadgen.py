@@ -0,0 +1,245 @@
+"""
+Synthetic D-MIC senders for load tests.
+
+Each waveform is rendered once into a loopable int16 table. Frames are
+memoryview slices of that table, so producing a packet costs no
+per-sample Python work. For pcm16 and ulaw the table is also encoded
+once, and a payload is a slice too. ulaw4 works in blocks, so it is
+still encoded per frame, like a real phone does it.
+
+Streams are paced against deadlines on the monotonic clock, so the
+average rate is exact however long a run lasts. A sender that falls
+far behind (a suspended laptop, say) restarts its schedule instead of
+bursting to catch up.
+
+    python loadgen.py 192.168.1.20 --streams 8 --wave speech --codec ulaw --duration 60
+    python loadgen.py 127.0.0.1 --loss 0.1 --adapt      # watch the senders step down
+    python loadgen.py 127.0.0.1 --skew-ppm 300 --duration 600  # a phone with a fast clock
+
+Stdlib-only (numpy is used by codec.py when present) so dmic_client.py
+can use it for its mock source.
+"""
+import argparse
+import array
+import math
+import random
+import socket
+import sys
+import time
+
+import codec
+import protocol
+from protocol import FMT_PCM16, FMT_ULAW
+
+WAVES = ('tone', 'sweep', 'noise', 'speech')
+MAX_BEHIND = 8      # frames late before the schedule is restarted
+
+
+def waveform(kind, rate, seconds=2.0, level=8000, seed=1):
+    """One seamlessly loopable stretch of `kind`, as array('h')."""
+    n = int(rate * seconds)
+    rnd = random.Random(seed)
+    sin, pi = math.sin, math.pi
+    if kind == 'tone':
+        # A whole number of cycles, so the loop point is seamless.
+        w = 2 * pi * round(440 * seconds) / n
+        vals = [level * sin(w * i) for i in range(n)]
+    elif kind == 'sweep':
+        # Exponential 100 Hz -> 8 kHz sweep, restarting each loop.
+        f0, f1 = 100.0, min(8000.0, rate * 0.45)
+        k = math.log(f1 / f0) / n
+        c = 2 * pi * f0 / (rate * k)
+        vals = [level * sin(c * math.expm1(k * i)) for i in range(n)]
+    elif kind == 'noise':
+        vals = [max(-3.0, min(3.0, rnd.gauss(0.0, 1.0))) * level / 3 for _ in range(n)]
+    elif kind == 'speech':
+        # Syllable-like bursts: a few harmonics of a wandering pitch under a
+        # raised-cosine envelope, separated by short near-silent gaps.
+        vals = []
+        while len(vals) < n:
+            on = int(rate * rnd.uniform(0.12, 0.25))
+            off = int(rate * rnd.uniform(0.05, 0.15))
+            f = rnd.uniform(110, 180)
+            amp = level * rnd.uniform(0.4, 1.0)
+            w = 2 * pi * f / rate
+            for i in range(on):
+                env = 0.5 - 0.5 * math.cos(2 * pi * i / on)
+                vals.append(amp * env * (0.6 * sin(w * i) + 0.3 * sin(2 * w * i)
+                                         + 0.1 * sin(3 * w * i)))
+            vals.extend(rnd.uniform(-level, level) * 0.01 for _ in range(off))
+        vals = vals[:n]
+    else:
+        raise ValueError(f"Unknown waveform: {kind} (choose from {', '.join(WAVES)})")
+    return array.array('h', [int(v) for v in vals])
+
+
+class LossySocket(socket.socket):
+    """A UDP socket that silently drops a fraction of what it sends."""
+
+    def __init__(self, loss, seed=None):
+        super().__init__(socket.AF_INET, socket.SOCK_DGRAM)
+        self.loss = loss
+        self._rnd = random.Random(seed)
+
+    def sendmsg(self, buffers, *args):
+        if self._rnd.random() < self.loss:
+            # Bytes, as the real call reports: a buffer's len() may count samples.
+            return sum(memoryview(b).nbytes for b in buffers)
+        return super().sendmsg(buffers, *args)
+
+    def sendto(self, data, *args):
+        if self._rnd.random() < self.loss:
+            return memoryview(data).nbytes
+        return super().sendto(data, *args)
+
+
+class Synth:
+    """Endless frames of one waveform, already laid out for the wire."""
+
+    def __init__(self, kind, rate, frames, fmt=FMT_PCM16, channels=1, offset=0):
+        table = waveform(kind, rate)
+        if channels > 1:
+            table = array.array('h', [v for v in table for _ in range(channels)])
+        self.period = len(table)
+        self.step = frames * channels
+        # One extra frame past the loop point makes every frame one slice.
+        table.extend(table[:self.step])
+        self.table = table
+        self.pcm = memoryview(table).cast('B').cast('h')
+        self.recode(fmt)
+        self.pos = (offset * self.step) % self.period
+
+    def recode(self, fmt):
+        """Switch the wire format, keeping the position in the waveform."""
+        self.fmt = fmt
+        self.coded = None
+        if fmt in (FMT_PCM16, FMT_ULAW):
+            self.coded = memoryview(codec.encode(fmt, self.table.tobytes()))
+            self.width = 2 if fmt == FMT_PCM16 else 1
+
+    def next(self):
+        """(payload, pcm) for the next frame; pcm is an int16 memoryview."""
+        i, j = self.pos, self.pos + self.step
+        self.pos = j % self.period
+        pcm = self.pcm[i:j]
+        if self.coded is not None:
+            return self.coded[i * self.width:j * self.width], pcm
+        return codec.encode(self.fmt, pcm.cast('B')), pcm
+
+
+def run(addr, streams=1, rate=44100, frames=1024, wave='tone', fmt=FMT_PCM16, channels=1,
+        fec=0, duration=0.0, t0=None, stop=None, on_frame=None, adapt=False, loss=0.0,
+        on_change=None, skew_ppm=0.0):
+    """
+    Stream `streams` synthetic senders to `addr` until `duration` seconds
+    have been sent, or `stop()` returns true. Frames are due at
+    t0 + (i + 1) * frames / rate, t0 defaulting to now. on_frame(i, pcm)
+    sees the first stream's frames. With `adapt`, each sender follows the
+    server's reports (on_change(k, name, report) sees every step); `loss`
+    drops that fraction of outgoing datagrams. skew_ppm runs the senders'
+    sample clock that much fast (or slow), like a real phone's. Returns
+    counters.
+    """
+    senders, synths = [], []
+    for k in range(streams):
+        sock = LossySocket(loss, seed=k) if loss else socket.socket(socket.AF_INET,
+                                                                   socket.SOCK_DGRAM)
+        adapter = None
+        if adapt:
+            from adapt import Adapter
+            adapter = Adapter(fmt, fec, codec.available(),
+                              on_change=on_change and (lambda name, r, k=k: on_change(k, name, r)))
+        sender = protocol.StreamSender(sock, addr, rate, channels, fmt=fmt, fec_group=fec,
+                                       adapter=adapter)
+        sender.hello()
+        senders.append(sender)
+        # Stagger streams so they are not sample-identical.
+        synths.append(Synth(wave, rate, frames, sender.fmt, sender.channels, offset=k * 7))
+
+    period = frames / rate / (1 + skew_ppm * 1e-6)
+    t0 = time.monotonic() if t0 is None else t0
+    end = t0 + duration if duration else None
+    cpu0 = time.process_time()
+    sent = late = resyncs = errors = 0
+    i = 0
+    try:
+        while not (stop and stop()):
+            due = t0 + (i + 1) * period
+            if end is not None and due > end:
+                break
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -MAX_BEHIND * period:
+                # Far behind: restart the schedule rather than burst.
+                t0 -= delay
+                resyncs += 1
+            elif delay < -period:
+                late += 1
+            first = None
+            for sender, synth in zip(senders, synths):
+                if synth.fmt != sender.fmt:
+                    synth.recode(sender.fmt)    # the adapter switched codecs
+                payload, pcm = synth.next()
+                if first is None:
+                    first = pcm
+                try:
+                    sender.send(payload, frames)
+                    sent += 1
+                except OSError:
+                    errors += 1
+            if on_frame:
+                on_frame(i, first)
+            i += 1
+    finally:
+        for sender in senders:
+            sender.bye()
+            sender.sock.close()
+    return {'sent': sent, 'late': late, 'resyncs': resyncs, 'errors': errors,
+            'cpu_s': time.process_time() - cpu0, 'frames': i,
+            'levels': [s.adapter.name for s in senders if s.adapter]}
+
+
+def main(argv=None):
+    from config import PORT
+    p = argparse.ArgumentParser(description="D-MIC synthetic load generator")
+    p.add_argument('host')
+    p.add_argument('--port', type=int, default=PORT)
+    p.add_argument('--streams', type=int, default=1)
+    p.add_argument('--rate', type=int, default=44100)
+    p.add_argument('--frames', type=int, default=1024, help="samples per channel per packet")
+    p.add_argument('--channels', type=int, default=1)
+    p.add_argument('--wave', choices=WAVES, default='tone')
+    p.add_argument('--codec', choices=[protocol.FMT_NAMES[f] for f in codec.available()],
+                   default='pcm16')
+    p.add_argument('--fec', type=int, default=0)
+    p.add_argument('--duration', type=float, default=10.0, help="seconds, 0 = until Ctrl+C")
+    p.add_argument('--adapt', action='store_true', help="follow the server's receiver reports")
+    p.add_argument('--loss', type=float, default=0.0, help="drop this fraction of datagrams")
+    p.add_argument('--skew-ppm', type=float, default=0.0,
+                   help="sample clock this many ppm fast (negative: slow)")
+    args = p.parse_args(argv)
+
+    def on_change(k, name, report):
+        print(f"stream {k}: -> {name} (loss {report.loss / 10:.1f}% after FEC "
+              f"{report.residual / 10:.1f}% late {report.late / 10:.1f}%)", flush=True)
+
+    print(f"{args.streams} x {args.wave} {args.rate}Hz/{args.frames} {args.codec} "
+          f"-> {args.host}:{args.port}", flush=True)
+    try:
+        res = run((args.host, args.port), args.streams, args.rate, args.frames, args.wave,
+                  codec.lookup(args.codec), args.channels, args.fec, args.duration,
+                  adapt=args.adapt, loss=args.loss, on_change=on_change,
+                  skew_ppm=args.skew_ppm)
+    except KeyboardInterrupt:
+        return 0
+    span = res['frames'] * args.frames / args.rate
+    print(f"sent {res['sent']} packets in {span:.1f}s, late {res['late']}, "
+          f"resyncs {res['resyncs']}, errors {res['errors']}, "
+          f"cpu {100 * res['cpu_s'] / max(span, 1e-9):.1f}%"
+          + (f", levels {' '.join(res['levels'])}" if res['levels'] else ""), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+Level metering computed in the audio path.
+
+Meter.update() runs once per played block and publishes a single
+(peak, rms, hold) tuple. Rebinding an attribute is atomic under the GIL,
+so the GUI can poll `level` at its own refresh rate with no lock, and no
+per-packet events or audio buffers ever cross into the GUI thread.
+"""
+import math
+import time
+
+import numpy as np
+
+from config import VU_HOLD_MS
+
+SILENT = (0.0, 0.0, 0.0)
+
+
+class Meter:
+    def __init__(self, hold_ms=VU_HOLD_MS, decay=1.5):
+        self.hold_time = hold_ms / 1000.0
+        self.decay = decay          # hold fall rate after the hold time, in full scales/s
+        self.level = SILENT         # (peak, rms, peak-hold), all 0..1 of full scale
+        self._hold = 0.0
+        self._hold_at = 0.0
+
+    def update(self, frame, now=None):
+        if now is None:
+            now = time.monotonic()
+        peak = max(int(frame.max()), -int(frame.min())) / 32768.0
+        rms = math.sqrt(float(np.mean(np.square(frame, dtype=np.float32)))) / 32768.0
+        held = self._hold - self.decay * max(0.0, now - self._hold_at - self.hold_time)
+        if peak >= held:
+            self._hold, self._hold_at, held = peak, now, peak
+        self.level = (peak, rms, held)
+
+    def reset(self):
+        self._hold = 0.0
+        self.level = SILENT
@@ -0,0 +1,194 @@
+"""
+Receiver health metrics over HTTP.
+
+The receive thread only bumps plain integers: counters on the engine and
+its sources, and Histogram bucket counts. It never takes a lock. The
+exporter thread reads those values when scraped. Each read is atomic
+under the GIL, so a scrape may be a packet out of step between two
+figures, never torn.
+
+    GET /metrics        Prometheus text format
+    GET /metrics.json   the same figures as JSON
+"""
+import bisect
+import json
+import threading
+import time
+
+# Decode time buckets, seconds.
+DECODE_BUCKETS = (5e-6, 10e-6, 25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 5e-3)
+
+
+class Histogram:
+    """Fixed-bucket histogram, single writer, lock-free."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)     # last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts keyed by upper bound, sum, count)."""
+        counts = list(self.counts)
+        total, buckets = 0, []
+        for bound, n in zip(self.bounds + (float('inf'),), counts):
+            total += n
+            buckets.append((bound, total))
+        return buckets, self.sum, total
+
+
+def collect(engine):
+    """Read the engine's figures into a plain dict."""
+    now = time.monotonic()
+    out = engine.playout
+    sources = []
+    for src in list(engine.sources.values()):
+        jb = src.jb
+        span = now - src.first_seen
+        sources.append({
+            'source': src.name,
+            'ssrc': f"{src.ssrc:08x}",
+            'format': f"{src.rate}/{src.channels}/{src.fmt}",
+            'packets': src.packets,
+            'bytes': src.bytes,
+            'bitrate': src.bytes * 8 / span if span > 0 else 0.0,
+            'frames_received': jb.received,
+            'frames_lost': jb.lost,
+            'frames_late': jb.late,
+            'duplicates': jb.duplicates,
+            'reordered': src.reordered,
+            'malformed': src.malformed,
+            'fec_recovered': src.fec.recovered,
+            'jitter_seconds': jb.jitter,
+            'target_delay_seconds': jb.target,
+            'buffer_frames': jb.depth,
+            'ring_frames': src.lane.fill,
+            'clock_drift_ppm': src.drift.ppm if src.drift else 0.0,
+            'decode_seconds': src.decode_time.snapshot(),
+        })
+    return {
+        'uptime_seconds': now - engine.started,
+        'packets': engine.packets,
+        'bytes': engine.bytes,
+        'malformed': engine.malformed,
+        'sources_active': len(sources),
+        'sources_total': engine.sources_total,
+        'underruns': engine.underruns,
+        'overruns': engine.overruns,
+        'output_rate': out.rate if out else 0,
+        'sources': sources,
+    }
+
+
+# name: (type, help). Per-source names get a `source` and `ssrc` label.
+_ENGINE = {
+    'uptime_seconds': ('gauge', "Seconds since the engine started"),
+    'packets': ('counter', "Datagrams received"),
+    'bytes': ('counter', "Bytes received"),
+    'malformed': ('counter', "Control datagrams too short to read, or with an unusable format"),
+    'sources_active': ('gauge', "Senders currently streaming"),
+    'sources_total': ('counter', "Senders seen since start"),
+    'underruns': ('counter', "Output blocks the mix ring could not fill"),
+    'overruns': ('counter', "Writes that did not fit in the mix ring"),
+    'output_rate': ('gauge', "Output sample rate in Hz"),
+}
+_SOURCE = {
+    'packets': ('counter', "Datagrams from this sender"),
+    'bytes': ('counter', "Bytes from this sender"),
+    'bitrate': ('gauge', "Average received bit rate"),
+    'frames_received': ('counter', "Audio frames accepted into the jitter buffer"),
+    'frames_lost': ('counter', "Frames concealed because they never arrived"),
+    'frames_late': ('counter', "Frames dropped for arriving after their slot"),
+    'duplicates': ('counter', "Frames received twice"),
+    'reordered': ('counter', "Frames that arrived after a later one"),
+    'malformed': ('counter', "Payloads with an unknown format or truncated data"),
+    'fec_recovered': ('counter', "Frames rebuilt from parity"),
+    'jitter_seconds': ('gauge', "Smoothed inter-arrival jitter"),
+    'target_delay_seconds': ('gauge', "Adaptive jitter buffer delay"),
+    'buffer_frames': ('gauge', "Frames held in the jitter buffer"),
+    'ring_frames': ('gauge', "Samples queued in the mix ring ahead of the device"),
+    'clock_drift_ppm': ('gauge', "Sender clock minus sound card clock, as corrected"),
+}
+
+
+def prometheus(data):
+    lines = []
+    for name, (kind, text) in _ENGINE.items():
+        lines += [f"# HELP dmic_{name} {text}", f"# TYPE dmic_{name} {kind}",
+                  f"dmic_{name} {data[name]}"]
+    sources = data['sources']
+    for name, (kind, text) in _SOURCE.items():
+        lines += [f"# HELP dmic_source_{name} {text}", f"# TYPE dmic_source_{name} {kind}"]
+        for s in sources:
+            lines.append(f'dmic_source_{name}{{source="{s["source"]}",ssrc="{s["ssrc"]}"}} {s[name]}')
+    lines += ["# HELP dmic_source_decode_seconds Payload decode time",
+              "# TYPE dmic_source_decode_seconds histogram"]
+    for s in sources:
+        labels = f'source="{s["source"]}",ssrc="{s["ssrc"]}"'
+        buckets, total, count = s['decode_seconds']
+        for bound, n in buckets:
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'dmic_source_decode_seconds_bucket{{{labels},le="{le}"}} {n}')
+        lines += [f'dmic_source_decode_seconds_sum{{{labels}}} {total}',
+                  f'dmic_source_decode_seconds_count{{{labels}}} {count}']
+    return '\n'.join(lines) + '\n'
+
+
+def to_json(data):
+    for s in data['sources']:
+        buckets, total, count = s['decode_seconds']
+        s['decode_seconds'] = {'buckets': [['+Inf' if b == float('inf') else b, n]
+                                           for b, n in buckets],
+                               'sum': total, 'count': count}
+    return json.dumps(data)
+
+
+class MetricsServer:
+    """Serves an engine's metrics from a daemon thread."""
+
+    def __init__(self, engine, port, host='127.0.0.1'):
+        # Imported here: the engine needs Histogram, not an HTTP stack.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.engine = engine    # front ends may swap in a new engine
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body, ctype = prometheus(collect(exporter.engine)), 'text/plain; version=0.0.4'
+                elif path == '/metrics.json':
+                    body, ctype = to_json(collect(exporter.engine)), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       name="DMIC-Metrics", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
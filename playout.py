@@ -0,0 +1,226 @@
+"""
+Callback-driven, mixing playout for the D-MIC server.
+
+Every source owns a Lane: a write cursor into one shared, preallocated
+float32 ring. A lane adds its frames into the ring at the position where
+they are due, so sources are mixed as they are written. The sounddevice
+callback then copies out, clips and clears exactly the block the device
+asks for. The callback's cost does not depend on how many sources are
+mixed, and the receive thread never blocks on the sound card.
+
+The read cursor belongs to the callback and the lane cursors to the
+receive thread. Lanes only write at least two guard intervals (device
+blocks) ahead of the read cursor they last saw: that cursor may already
+be stale by the block the callback is clearing, so the two never touch
+the same samples and no lock is needed.
+
+Playout drives the ring from a sound card. SinkPlayout drives it from the
+system clock and either discards the audio or writes it to a WAV file,
+for benchmarks and machines with no output device.
+"""
+import threading
+import time
+import wave
+
+import numpy as np
+
+from config import PLAYOUT_BUFFER_MS, PLAYOUT_CUSHION_MS
+
+
+class MixRing:
+    def __init__(self, capacity, channels, cushion=0):
+        self.buf = np.zeros((capacity, channels), dtype=np.float32)
+        self.capacity = capacity
+        self.channels = channels
+        self.cushion = cushion
+        self.guard = max(1, cushion // 3)   # raised to the device block size
+        self._r = 0             # frames read, only touched by the consumer
+        self._end = 0           # furthest position any lane has written
+        self._dry = True
+        self.underruns = 0
+        self.overruns = 0
+
+    def lane(self):
+        return Lane(self)
+
+    def read_into(self, out):
+        n = len(out)
+        if n > self.guard:
+            self.guard = n
+        r = self._r
+        i = r % self.capacity
+        j = min(n, self.capacity - i)
+        for seg, dst in ((self.buf[i:i + j], out[:j]), (self.buf[:n - j], out[j:])):
+            np.clip(seg, -32768, 32767, out=seg)
+            dst[:] = seg
+            seg.fill(0.0)
+        self._r = r + n
+        if r + n > self._end:
+            if not self._dry:
+                self.underruns += 1
+            self._dry = True
+        else:
+            self._dry = False
+
+
+class Lane:
+    """One source's write cursor into a MixRing."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.pos = None
+        self.late = 0           # times the source fell behind the device
+        self.starts = 0         # (re)starts, each at a fresh lead
+        self.lead = 0           # frames ahead of the device at the last start
+        self.slack = 0          # frames ahead of that lead at the last write
+
+    @property
+    def fill(self):
+        """Frames this lane has queued ahead of the device."""
+        return 0 if self.pos is None else max(0, self.pos - self.ring._r)
+
+    def write(self, frames, gain=1.0):
+        ring = self.ring
+        r = ring._r
+        if self.pos is None or self.pos < r + 2 * ring.guard:
+            # (Re)starting or fell behind: lead the device by a cushion,
+            # and by a block more than the two a write must stay ahead.
+            if self.pos is not None:
+                self.late += 1
+            self.starts += 1
+            self.lead = max(ring.cushion, 3 * ring.guard)
+            self.pos = r + self.lead
+        # Drifts away from 0 when the source's clock and the device's differ.
+        self.slack = self.pos - r - self.lead
+        buf = ring.buf
+        c = frames.shape[1]
+        if c != ring.channels:
+            if ring.channels == 1:
+                frames = frames.mean(axis=1, keepdims=True)     # downmix
+            elif c == 1:
+                pass                        # mono broadcasts over every output
+            elif c > ring.channels:
+                frames = frames[:, :ring.channels]
+            else:
+                buf = buf[:, :c]            # fewer channels: fill the first c
+        n = len(frames)
+        room = r + ring.capacity - self.pos
+        if n > room:
+            ring.overruns += 1
+            frames, n = frames[:room], room
+        i = self.pos % ring.capacity
+        k = min(n, ring.capacity - i)
+        if gain == 1.0:
+            buf[i:i + k] += frames[:k]
+            buf[:n - k] += frames[k:]
+        else:
+            buf[i:i + k] += frames[:k] * gain
+            buf[:n - k] += frames[k:] * gain
+        self.pos += n
+        if self.pos > ring._end:
+            ring._end = self.pos
+
+
+class _RingOutput:
+    def __init__(self, rate, channels, buffer_ms, cushion_ms):
+        self.rate = rate
+        self.channels = channels
+        self.ring = MixRing(int(rate * buffer_ms / 1000), channels,
+                            int(rate * cushion_ms / 1000))
+
+    @property
+    def latency(self):
+        """Seconds from leaving the ring to reaching the speaker."""
+        return 0.0
+
+    @property
+    def underruns(self):
+        return self.ring.underruns
+
+    @property
+    def overruns(self):
+        return self.ring.overruns
+
+    def lane(self):
+        return self.ring.lane()
+
+
+class Playout(_RingOutput):
+    """sounddevice OutputStream playing a MixRing."""
+
+    def __init__(self, rate, channels, device=None,
+                 buffer_ms=PLAYOUT_BUFFER_MS, cushion_ms=PLAYOUT_CUSHION_MS):
+        import sounddevice as sd
+        super().__init__(rate, channels, buffer_ms, cushion_ms)
+        self.stream = sd.OutputStream(
+            samplerate=rate,
+            channels=channels,
+            dtype='int16',
+            device=device,
+            latency='low',
+            callback=self._callback
+        )
+
+    @property
+    def latency(self):
+        return self.stream.latency
+
+    def _callback(self, outdata, frames, time, status):
+        self.ring.read_into(outdata)
+
+    def start(self):
+        self.stream.start()
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+class SinkPlayout(_RingOutput):
+    """
+    Reads a MixRing in `block`-frame steps paced by the monotonic clock,
+    like a sound card would, and discards the audio or appends it to the
+    WAV file at `path`.
+    """
+
+    def __init__(self, rate, channels, path=None, block=256,
+                 buffer_ms=PLAYOUT_BUFFER_MS, cushion_ms=PLAYOUT_CUSHION_MS):
+        super().__init__(rate, channels, buffer_ms, cushion_ms)
+        self.path = path
+        self.block = block
+        self._running = False
+        self._thread = None
+
+    def _run(self):
+        out = np.zeros((self.block, self.channels), dtype=np.int16)
+        wav = None
+        if self.path:
+            wav = wave.open(self.path, 'wb')
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(2)
+            wav.setframerate(self.rate)
+        step = self.block / self.rate
+        due = time.monotonic()
+        try:
+            while self._running:
+                self.ring.read_into(out)
+                if wav:
+                    wav.writeframes(out.tobytes())
+                # Absolute schedule, so sleep overshoot does not accumulate.
+                due += step
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            if wav:
+                wav.close()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="DMIC-Sink", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,142 @@
+"""
+Opt-in per-stage timing for the streaming loops.
+
+A loop takes a timestamp once and then calls lap() after each stage:
+
+    t = prof.start()
+    n = recorder.read(...)
+    t = prof.lap('read', t)
+    sender.send(...)
+    t = prof.lap('send', t)
+
+Each lap goes into that stage's fixed histogram of quarter-octave
+nanosecond buckets (perf_counter_ns), so memory never grows and
+recording a lap costs one clock read and a few integer adds. get()
+returns the shared OFF object unless profiling was asked for; its
+start() and lap() do nothing, so leaving the calls in costs almost
+nothing. report() renders a table, for dumping on demand or at exit.
+
+Stdlib-only so the phone client can use it. Enable with
+DMIC_PROFILE=1 in the environment or the front end's own switch.
+"""
+import atexit
+import os
+import time
+
+BUCKETS = 256       # 4 per power of two: 2 bits of mantissa after the leading 1
+
+
+def _bucket(ns):
+    bits = ns.bit_length()
+    if bits < 3:
+        return ns
+    return (bits << 2) | ((ns >> (bits - 3)) & 3)
+
+
+def _upper(i):
+    """Largest ns value that falls in bucket i."""
+    bits, sub = i >> 2, i & 3
+    if bits < 3:
+        return i
+    return ((5 + sub) << (bits - 3)) - 1
+
+
+class Stage:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns):
+        self.counts[min(_bucket(ns), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """Upper bound, in ns, of the bucket holding the q-th percentile."""
+        want = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= want:
+                return min(_upper(i), self.max)
+        return self.max
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.since = time.monotonic()
+
+    def start(self):
+        return time.perf_counter_ns()
+
+    def lap(self, stage, t0):
+        """Record the time since t0 under `stage` and return the new time."""
+        now = time.perf_counter_ns()
+        st = self.stages.get(stage)
+        if st is None:
+            st = self.stages[stage] = Stage()
+        st.add(now - t0)
+        return now
+
+    def reset(self):
+        self.stages = {}
+        self.since = time.monotonic()
+
+    def report(self):
+        span = time.monotonic() - self.since
+        lines = [f"── {self.name} profile, {span:.1f}s ──",
+                 f"{'stage':<12}{'count':>9}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}"
+                 f"{'max us':>10}{'total ms':>10}"]
+        for name, st in list(self.stages.items()):
+            if not st.count:
+                continue
+            lines.append(f"{name:<12}{st.count:>9}{st.total / st.count / 1e3:>10.1f}"
+                         f"{st.percentile(50) / 1e3:>10.1f}{st.percentile(99) / 1e3:>10.1f}"
+                         f"{st.max / 1e3:>10.1f}{st.total / 1e6:>10.1f}")
+        return '\n'.join(lines)
+
+    def dump_at_exit(self, write=print):
+        atexit.register(lambda: self.stages and write(self.report()))
+        return self
+
+
+class _Off:
+    """Stands in for a Profiler when profiling is off."""
+    enabled = False
+    name = 'off'
+    stages = {}
+
+    def start(self):
+        return 0
+
+    def lap(self, stage, t0):
+        return 0
+
+    def reset(self):
+        pass
+
+    def report(self):
+        return ""
+
+    def dump_at_exit(self, write=print):
+        return self
+
+
+OFF = _Off()
+
+
+def get(name, enabled=None):
+    """A Profiler if `enabled` (default: DMIC_PROFILE is set), else OFF."""
+    if enabled is None:
+        enabled = os.environ.get('DMIC_PROFILE', '') not in ('', '0')
+    return Profiler(name) if enabled else OFF
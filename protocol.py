@@ -0,0 +1,303 @@
+"""
+D-MIC wire format.
+
+Every datagram starts with a fixed 24-byte header so the receiver never
+has to guess how to play a payload:
+
+    magic     2s   b'DM'
+    version   B
+    kind      B    KIND_*
+    fmt       B    payload format (FMT_*)
+    channels  B
+    flags     B    FLAG_*
+    reserved  B
+    ssrc      I    random id, new for every stream start
+    seq       I    frame sequence number
+    ts        I    capture timestamp in samples (RTP style)
+    rate      I    sample rate in Hz
+
+A stream opens with KIND_HELLO, repeated until the server answers with
+KIND_HELLO_ACK or a short timeout passes, and closes with KIND_BYE. The
+ACK's channel count is the most the server will play; the sender drops
+any channels above it before they cost airtime. Since every audio
+datagram is self-describing the handshake is only a fast path; a lost
+HELLO never leaves the server guessing.
+
+Latency is measured in band. About once a second the sender sends a
+KIND_PING; the server answers at once with a KIND_PONG carrying its own
+receive and reply times. From the four timestamps the sender estimates
+the round trip and the offset between the two clocks (NTP style, best
+of the last few), and reports both in its next PING. With FLAG_STAMP set,
+each audio payload starts with the capture time of its first sample on
+the sender's clock, which the server moves onto its own clock with the
+reported offset. All times are CLOCK_MONOTONIC nanoseconds.
+
+About once a second the server also tells each sender how its stream is
+arriving, in a KIND_REPORT sent back as the reply to an audio datagram:
+loss before and after FEC, late drops, jitter and buffer depth. A sender
+with an adapt.Adapter uses it to step its codec and parity up or down.
+
+Datagrams without the magic are legacy raw int16 mono at config.RATE.
+This module (and fec.py) is stdlib-only so the phone clients can import it.
+"""
+import random
+import select
+import socket
+import struct
+import time
+from collections import namedtuple
+
+from fec import ParityEncoder
+
+MAGIC = b'DM'
+VERSION = 1
+HEADER = struct.Struct('!2sBBBBBBIIII')
+
+KIND_AUDIO     = 0
+KIND_HELLO     = 1
+KIND_HELLO_ACK = 2
+KIND_BYE       = 3
+KIND_FEC       = 4      # XOR parity over the previous frames, see fec.py
+KIND_PING      = 5      # clock probe, payload PING
+KIND_PONG      = 6      # server's answer, payload PONG
+KIND_REPORT    = 7      # receiver report to the sender, payload REPORT
+
+FMT_PCM16 = 0
+FMT_ULAW  = 1
+FMT_ULAW4 = 2
+FMT_NAMES = {FMT_PCM16: 'pcm16', FMT_ULAW: 'ulaw', FMT_ULAW4: 'ulaw4'}
+FMT_BY_NAME = {v: k for k, v in FMT_NAMES.items()}
+
+# Stream formats a receiver will configure itself for; anything else is
+# refused before it can size a buffer or divide by the rate.
+MIN_RATE = 8000
+MAX_RATE = 192000
+MAX_WIRE_CHANNELS = 8
+
+FLAG_PLANAR = 0x01      # payload holds whole channels back to back, not interleaved
+FLAG_STAMP  = 0x02      # payload starts with STAMP, the capture time of its first sample
+
+STAMP = struct.Struct('!q')     # capture time, sender clock, ns
+PING = struct.Struct('!qqi')    # sent at (sender ns), clock offset (ns), rtt (us, -1 unknown)
+PONG = struct.Struct('!qqq')    # the PING's sent-at, server receive ns, server reply ns
+# Per mille of the frames due since the previous report: missing before
+# FEC, still missing after it, dropped as late. Then jitter (us), jitter
+# buffer target (us), frames buffered, and the highest seq received.
+REPORT = struct.Struct('!HHHIIHI')
+Report = namedtuple('Report', 'loss residual late jitter target depth seq')
+
+Header = namedtuple('Header', 'kind fmt channels flags ssrc seq ts rate')
+
+REPLY_POLL_NS = 100000000   # how often a sender checks for reports
+
+
+def pack(kind, fmt, channels, flags, ssrc, seq, ts, rate):
+    return HEADER.pack(MAGIC, VERSION, kind, fmt, channels, flags, 0,
+                       ssrc, seq & 0xFFFFFFFF, ts & 0xFFFFFFFF, rate)
+
+
+def parse(data):
+    """Split a datagram into (Header, payload). Returns None for legacy PCM."""
+    if len(data) < HEADER.size or data[:2] != MAGIC:
+        return None
+    magic, ver, kind, fmt, ch, flags, _, ssrc, seq, ts, rate = HEADER.unpack_from(data)
+    if ver != VERSION:
+        return None
+    return Header(kind, fmt, ch, flags, ssrc, seq, ts, rate), memoryview(data)[HEADER.size:]
+
+
+def sane(hdr):
+    """True if the header's rate and channel count are within limits."""
+    return MIN_RATE <= hdr.rate <= MAX_RATE and 1 <= hdr.channels <= MAX_WIRE_CHANNELS
+
+
+def layout(pcm, channels, keep=None, planar=False):
+    """
+    Rearrange interleaved int16 PCM for the wire: keep the first `keep`
+    channels and optionally go planar. Uses strided memoryview copies, one
+    per channel, so cost per packet does not grow with the sample count
+    in Python terms.
+    """
+    keep = keep or channels
+    if channels == 1 or (keep == channels and not planar):
+        return pcm
+    mv = memoryview(pcm).cast('B').cast('h')
+    if planar or keep == 1:
+        return b''.join(mv[c::channels].tobytes() for c in range(keep))
+    out = bytearray(len(mv) // channels * keep * 2)
+    dst = memoryview(out).cast('h')
+    for c in range(keep):
+        dst[c::keep] = mv[c::channels]
+    return out
+
+
+def set_rcvbuf(sock, nbytes):
+    """Ask for an nbytes socket receive buffer. Returns what the OS granted."""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, nbytes)
+    except OSError:
+        pass    # capped by the OS (net.core.rmem_max on Linux)
+    return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+
+class DatagramReader:
+    """
+    Receives into one preallocated buffer instead of a new bytes object
+    per datagram. recv() returns a memoryview that is only valid until the
+    next call: anything kept longer must be copied out.
+    """
+
+    def __init__(self, sock, size):
+        self.sock = sock
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+
+    def recv(self):
+        """(datagram view, addr). Raises socket.timeout like recvfrom()."""
+        n, addr = self.sock.recvfrom_into(self.buf)
+        return self.view[:n], addr
+
+
+class StreamSender:
+    """Stamps and sends the frames of one outgoing stream."""
+
+    def __init__(self, sock, addr, rate, channels=1, fmt=FMT_PCM16, fec_group=0, planar=False,
+                 stamp=False, ping_interval=1.0, adapter=None):
+        self.sock = sock
+        self.addr = addr
+        self.rate = rate
+        self.capture_channels = channels
+        self.channels = channels        # on the wire; may shrink after HELLO_ACK
+        self.fmt = fmt
+        self.planar = planar
+        self.flags = FLAG_PLANAR if planar and channels > 1 else 0
+        if stamp:
+            self.flags |= FLAG_STAMP
+        self.ping_interval = int(ping_interval * 1e9)
+        self._next_ping = 0
+        self._next_read = 0
+        self._pings_out = 0
+        self._samples = []      # recent (rtt, offset) pairs, ns
+        self.rtt = None         # best recent round trip, ns
+        self.offset = 0         # server clock minus ours, ns
+        self.report = None      # latest Report from the server
+        self.adapter = adapter  # adapt.Adapter, steps fmt/fec on reports
+        self.ssrc = random.getrandbits(32)
+        self.seq = 0
+        self.ts = 0
+        self.fec = ParityEncoder(fec_group) if fec_group else None
+
+    def _header(self, kind):
+        return pack(kind, self.fmt, self.channels, self.flags,
+                    self.ssrc, self.seq, self.ts, self.rate)
+
+    def hello(self, tries=5, timeout=0.2):
+        """Announce the stream. Returns True once the server acknowledged."""
+        pkt = self._header(KIND_HELLO)
+        old = self.sock.gettimeout()
+        self.sock.settimeout(timeout)
+        try:
+            for _ in range(tries):
+                self.sock.sendto(pkt, self.addr)
+                try:
+                    while True:
+                        data, _ = self.sock.recvfrom(HEADER.size)
+                        p = parse(data)
+                        if p and p[0].kind == KIND_HELLO_ACK and p[0].ssrc == self.ssrc:
+                            if 0 < p[0].channels < self.channels:
+                                self.channels = p[0].channels
+                                if self.channels == 1:
+                                    self.flags &= ~FLAG_PLANAR
+                            return True
+                except socket.timeout:
+                    continue
+            return False
+        except OSError:
+            return False
+        finally:
+            self.sock.settimeout(old)
+
+    def layout(self, pcm):
+        """Put captured interleaved PCM into this stream's wire layout."""
+        return layout(pcm, self.capture_channels, self.channels, self.planar)
+
+    def _emit(self, header, *parts):
+        if hasattr(self.sock, 'sendmsg'):
+            # Gather write: the payload buffers go to the kernel as-is,
+            # without being concatenated onto the header first.
+            self.sock.sendmsg((header,) + parts, (), 0, self.addr)
+        else:
+            self.sock.sendto(header + b''.join(bytes(p) for p in parts), self.addr)
+
+    def ping(self, now=None):
+        """Send a clock probe, reporting the current offset/RTT estimate."""
+        now = time.monotonic_ns() if now is None else now
+        rtt = -1 if self.rtt is None else self.rtt // 1000
+        self._emit(self._header(KIND_PING), PING.pack(now, self.offset, rtt))
+        self._pings_out += 1
+        self._next_ping = now + self.ping_interval
+
+    def set_fec(self, group):
+        """Change the parity group size (0 = off); a partial group is dropped."""
+        self.fec = ParityEncoder(group) if group else None
+
+    def _read_replies(self):
+        while select.select((self.sock,), (), (), 0)[0]:
+            try:
+                data = self.sock.recv(HEADER.size + max(PONG.size, REPORT.size))
+            except OSError:
+                return
+            t4 = time.monotonic_ns()
+            p = parse(data)
+            if not p:
+                continue
+            if p[0].kind == KIND_REPORT and len(p[1]) >= REPORT.size:
+                self.report = Report(*REPORT.unpack_from(p[1]))
+                if self.adapter:
+                    self.adapter.update(self, self.report, t4)
+                continue
+            if p[0].kind != KIND_PONG or len(p[1]) < PONG.size:
+                continue
+            t1, t2, t3 = PONG.unpack_from(p[1])
+            self._pings_out = max(0, self._pings_out - 1)
+            self._samples = self._samples[-7:] + [((t4 - t1) - (t3 - t2),
+                                                   ((t2 - t1) + (t3 - t4)) // 2)]
+            # The fastest exchange has the least queueing in it, so its
+            # offset is the most trustworthy.
+            self.rtt, self.offset = min(self._samples)
+
+    def send(self, payload, frames, captured=None):
+        """
+        Send one frame of `frames` samples per channel. `captured` is the
+        capture time of its first sample (monotonic ns); when stamping and
+        it is not known, the frame is assumed to have just finished.
+        """
+        stamp = b''
+        now = time.monotonic_ns()
+        if self.flags & FLAG_STAMP:
+            if captured is None:
+                captured = now - frames * 1000000000 // self.rate
+            stamp = STAMP.pack(captured)
+        self._emit(self._header(KIND_AUDIO), stamp, payload)
+        if self.fec:
+            parity = self.fec.add(self.seq, self.ts, stamp + bytes(payload) if stamp else payload)
+            if parity:
+                base_seq, base_ts, data = parity
+                self._emit(pack(KIND_FEC, self.fmt, self.channels, self.flags,
+                                self.ssrc, base_seq, base_ts, self.rate), data)
+        self.seq += 1
+        self.ts += frames
+        if stamp and now >= self._next_ping:
+            self.ping(now)
+        # Replies are polled while a PONG is due, and a few times a second
+        # for reports, not on every packet. Last, so an adapter's switch
+        # applies from the next frame on.
+        if self._pings_out or now >= self._next_read:
+            self._next_read = now + REPLY_POLL_NS
+            self._read_replies()
+
+    def bye(self):
+        try:
+            self.sock.sendto(self._header(KIND_BYE), self.addr)
+        except OSError:
+            pass
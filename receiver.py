@@ -0,0 +1,170 @@
+"""
+asyncio front-end loop for the ReceiverEngine.
+
+One event loop serves any number of bound UDP sockets (ports) and every
+sender on them. Each socket is watched with add_reader(); when it turns
+readable the queue is drained through one shared DatagramReader, so
+receiving stays allocation-free, and each datagram goes to the engine at
+once. service() runs on a JITTER_POLL_MS timer, which also retires
+sources that stopped sending, and front ends can add their own timers
+with every() (stats lines, GUI refresh, ...).
+
+Every engine call happens on the loop's thread. Other threads talk to it
+through call(), which queues work onto the loop, and stop(), which ends
+serve() within one tick: no blocked recvfrom to break out of by closing
+the socket underneath it. Audio still leaves through the engine's mix
+ring, which the sound card callback drains on its own thread, and the GUI
+reads engine state without locks (see metrics.py).
+
+A datagram or timer call that raises is counted in `failures`, its first
+traceback of each kind goes to stderr, and serving carries on: one bad
+packet must not silence every sender. Only the loop or a socket failing
+ends serve() with an error.
+
+    rx = AsyncReceiver(engine, [sock])
+    rx.every(5.0, lambda: print(stats_line(engine)))
+    rx.run()            # blocks until rx.stop()
+
+run() makes its own SelectorEventLoop: add_reader() is not available on
+the Windows proactor loop.
+"""
+import asyncio
+import sys
+import traceback
+
+import profiler
+import protocol
+from config import *
+
+DRAIN = 64      # datagrams handled per wakeup before timers get a turn
+
+
+class AsyncReceiver:
+    def __init__(self, engine, socks, prof=profiler.OFF, poll=JITTER_POLL_MS / 1000.0):
+        self.engine = engine
+        self.socks = list(socks)
+        self.prof = prof
+        self.errors = 0         # send/receive errors (e.g. ICMP port unreachable)
+        self.failures = 0       # datagrams and timer calls that raised, then skipped
+        self._logged = set()    # (where, exception type) already printed
+        self._reader = protocol.DatagramReader(None, MAX_PACKET)
+        self._timers = [(poll, self._service)]
+        self._loop = None
+        self._stopped = None
+        self._stop = False
+        self._failed = None
+
+    def every(self, interval, fn):
+        """Call fn() on the loop every `interval` seconds while serving."""
+        self._timers.append((interval, fn))
+        return self
+
+    def call(self, fn, *args):
+        """Run fn(*args) on the loop thread (at once if not serving)."""
+        loop = self._loop
+        if loop is None:
+            fn(*args)
+        else:
+            loop.call_soon_threadsafe(fn, *args)
+
+    def stop(self):
+        """End serve(); safe from any thread or a signal handler."""
+        self._stop = True
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass    # loop already closed
+
+    def run(self):
+        loop = asyncio.SelectorEventLoop()
+        try:
+            loop.run_until_complete(self.serve())
+        finally:
+            loop.close()
+
+    async def serve(self):
+        """Serve until stop(). Re-raises an engine error after cleaning up."""
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._loop = loop
+        if self._stop:
+            self._stopped.set()
+        for sock in self.socks:
+            sock.setblocking(False)
+            loop.add_reader(sock.fileno(), self._readable, sock)
+        tasks = [asyncio.create_task(self._every(interval, fn)) for interval, fn in self._timers]
+        stopped = asyncio.create_task(self._stopped.wait())
+        try:
+            await asyncio.wait(tasks + [stopped], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for sock in self.socks:
+                loop.remove_reader(sock.fileno())
+            for task in tasks + [stopped]:
+                task.cancel()
+            done = await asyncio.gather(*tasks, return_exceptions=True)
+            self._loop = None
+        for res in done:
+            if isinstance(res, Exception):
+                raise res
+        if self._failed:
+            raise self._failed
+
+    async def _every(self, interval, fn):
+        # Deadline paced, so a slow callback does not stretch the period.
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            due += interval
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            try:
+                fn()
+            except Exception:
+                self._fail(getattr(fn, '__name__', 'timer'))
+
+    def _service(self):
+        prof = self.prof
+        t = prof.start()
+        self.engine.service()
+        prof.lap('service', t)
+
+    def _fail(self, where):
+        # Called from an except block: count it, print the first of a kind.
+        self.failures += 1
+        kind = (where, sys.exc_info()[0])
+        if kind not in self._logged:
+            self._logged.add(kind)
+            print(f"Error in {where} (further ones counted, not printed):", file=sys.stderr)
+            traceback.print_exc()
+
+    def _readable(self, sock):
+        engine, prof, reader = self.engine, self.prof, self._reader
+        reader.sock = sock
+        try:
+            for _ in range(DRAIN):
+                try:
+                    data, addr = reader.recv()
+                except (BlockingIOError, InterruptedError):
+                    return
+                except OSError:
+                    self.errors += 1
+                    return
+                t = prof.start()
+                try:
+                    reply = engine.handle(data, addr)
+                except Exception:
+                    self._fail('handle')
+                    continue
+                t = prof.lap('handle', t)
+                if reply:
+                    try:
+                        sock.sendto(reply, addr)
+                    except OSError:
+                        self.errors += 1
+                    prof.lap('reply', t)
+        except Exception as e:
+            # Not the datagram's fault: a reader callback's exception would
+            # only be logged by asyncio, so end serve() with it.
+            self._failed = e
+            self._stopped.set()
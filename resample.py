@@ -0,0 +1,122 @@
+"""
+Streaming band-limited resampler.
+
+Converts a stream block by block with the fractional read position carried
+across calls, so block boundaries are seamless, and so is a change of
+ratio between blocks. Used to bring sources whose rate differs from the
+output device onto the mix rate, and to trim a source's rate by the few
+ppm its clock drifts from the device's (see drift.py).
+
+Each output sample is a Kaiser-windowed sinc over TAPS zero crossings
+either side, read from a table of PHASES kernels and interpolated
+linearly between neighbouring phases. When the output rate is lower the
+cutoff moves down with it, so whatever the output cannot hold is
+filtered out instead of folding back into the band. The filter is flat
+to within a small fraction of a dB up to ROLLOFF of the lower Nyquist
+rate, whatever the fractional position, so a slowly sweeping phase
+(drift correction) does not modulate high frequencies the way linear
+interpolation does. The output lags the input by about TAPS input
+samples, scaled up when decimating.
+
+Each block is a handful of whole-array numpy operations regardless of
+length, into work arrays kept from the previous block.
+"""
+import math
+
+import numpy as np
+
+TAPS = 16           # sinc zero crossings on each side of the kernel
+PHASES = 256        # kernel table steps between two input samples
+ROLLOFF = 0.9       # passband edge, fraction of the lower Nyquist rate
+KAISER_BETA = 8.6   # about 80 dB stopband
+
+
+def _kernels(cut, half):
+    """(PHASES + 1, 2 * half) kernels; row p is for a read position p / PHASES past a sample."""
+    frac = np.arange(PHASES + 1)[:, None] / PHASES
+    x = np.arange(-half + 1, half + 1)[None, :] - frac       # tap distance, input samples
+    win = np.i0(KAISER_BETA * np.sqrt(np.clip(1.0 - (x / half) ** 2, 0.0, None)))
+    k = np.sinc(cut * x) * win
+    k /= k.sum(axis=1, keepdims=True)       # unity gain at DC for every phase
+    return k.astype(np.float32)
+
+
+class Resampler:
+    def __init__(self, ratio):
+        self.ratio = ratio          # output rate / input rate
+        cut = min(1.0, ratio) * ROLLOFF
+        self.half = int(math.ceil(TAPS / cut))      # taps each side, input samples
+        self.delay = self.half      # input samples the output lags by
+        self._table = _kernels(cut, self.half)
+        self._slope = np.ascontiguousarray(self._table[1:] - self._table[:-1])
+        self._taps = np.arange(2 * self.half)
+        self._t = float(self.half)  # next output position in _buf
+        self._buf = None            # [last 2 * half input samples, block]
+        self._size = 0              # output capacity of the work arrays
+        self._y = None
+
+    def _work(self, m, channels):
+        if self._y is None or m > self._size or self._y.shape[1] != channels:
+            size = max(m + 16, self._size)     # room for the ratio to move
+            width = 2 * self.half
+            self._ramp = np.arange(size, dtype=np.float64)
+            self._pos = np.empty(size)
+            self._floor = np.empty(size)
+            self._i0 = np.empty(size, dtype=np.intp)
+            self._p0 = np.empty(size, dtype=np.intp)
+            self._pf = np.empty((size, 1), dtype=np.float32)
+            self._idx = np.empty((size, width), dtype=np.intp)
+            self._w = np.empty((size, width), dtype=np.float32)
+            self._dw = np.empty((size, width), dtype=np.float32)
+            self._g = np.empty((size, width, channels), dtype=np.float32)
+            self._y = np.empty((size, channels), dtype=np.float32)
+            self._size = size
+
+    def process(self, x):
+        """
+        Resample an (n, channels) block. Returns float32 (m, channels),
+        valid until the next call.
+        """
+        x = np.asarray(x, dtype=np.float32)
+        n, c = x.shape
+        width = 2 * self.half
+        buf = self._buf
+        if buf is None or buf.shape[1] != c:
+            buf = self._buf = np.zeros((width + n, c), dtype=np.float32)
+        elif len(buf) != width + n:
+            tail = buf[:width].copy()
+            buf = self._buf = np.empty((width + n, c), dtype=np.float32)
+            buf[:width] = tail
+        # buf holds the previous block's last `width` samples, then this one.
+        buf[width:] = x
+        last = width + n - 1 - self.half    # furthest position with a full kernel
+        step = 1.0 / self.ratio
+        t = self._t
+        m = int(math.floor((last - t) / step)) + 1 if t <= last else 0
+        self._work(m, c)
+        pos, fl, i0, p0, pf = (self._pos[:m], self._floor[:m], self._i0[:m], self._p0[:m],
+                               self._pf[:m])
+        idx, w, dw, g, y = self._idx[:m], self._w[:m], self._dw[:m], self._g[:m], self._y[:m]
+        np.multiply(self._ramp[:m], step, out=pos)
+        pos += t
+        np.floor(pos, out=fl)
+        np.copyto(i0, fl, casting='unsafe')
+        # Phase of the read position between samples, as a table row and a fraction.
+        pos -= fl
+        pos *= PHASES
+        np.floor(pos, out=fl)
+        np.copyto(p0, fl, casting='unsafe')
+        np.minimum(p0, PHASES - 1, out=p0)
+        pos -= p0
+        np.copyto(pf[:, 0], pos, casting='same_kind')
+        # 'clip' keeps take() from buffering its output.
+        np.take(self._table, p0, axis=0, out=w, mode='clip')
+        np.take(self._slope, p0, axis=0, out=dw, mode='clip')
+        dw *= pf
+        w += dw
+        np.add(i0[:, None], self._taps - (self.half - 1), out=idx)
+        np.take(buf, idx, axis=0, out=g, mode='clip')
+        np.einsum('mt,mtc->mc', w, g, out=y)
+        self._t = t + m * step - n
+        buf[:width] = buf[n:]
+        return y
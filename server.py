@@ -1,22 +1,47 @@
+import math
 import socket
-import sounddevice as sd
-import numpy as np
+import sys
 import threading
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 from config import *
+import profiler
+import protocol
+
+# numpy and sounddevice (via engine) cost more to import than Tk itself,
+# so they load on a background thread once the window is up.
+ReceiverEngine = AsyncReceiver = None
+_engine_ready = threading.Event()
+
+
+def _load_engine():
+    global ReceiverEngine, AsyncReceiver
+    try:
+        from engine import ReceiverEngine
+        from receiver import AsyncReceiver
+    finally:
+        _engine_ready.set()
+
 
 class DMicServer:
-    def __init__(self):
+    def __init__(self, startup_bench=False):
+        self.startup_bench = startup_bench
         self.root = tk.Tk()
         self.root.title("D-MIC | Terminal")
-        self.root.geometry("400x300")
+        self.root.geometry("400x420")
         self.root.configure(bg="#0f0f0f")
         self.root.resizable(False, False)
 
         self.running = False
         self.sock = None
-        self.stream = None
+        self.engine = None
+        self.rx = None          # the receiver loop; owns the engine while running
+        self.thread = None
+        self.metrics = None
+        self.error = None       # why the receiver thread stopped, shown on the status line
+        # Ctrl+P prints the stage timings; they are also printed on exit.
+        self.prof = profiler.get('receiver', True if PROFILE else None).dump_at_exit()
 
         # Custom Styling
         style = ttk.Style()
@@ -30,7 +55,7 @@ class DMicServer:
         self.status_label = tk.Label(self.root, text="STATUS: OFFLINE", fg="#ff3333", bg="#0f0f0f", font=("Consolas", 12))
         self.status_label.pack(pady=5)
 
-        self.ip_label = tk.Label(self.root, text=f"IP ADDRESS: {get_local_ip()}", fg="#888", bg="#0f0f0f", font=("Consolas", 10))
+        self.ip_label = tk.Label(self.root, text="IP ADDRESS: ...", fg="#888", bg="#0f0f0f", font=("Consolas", 10))
         self.ip_label.pack(pady=5)
 
         tk.Label(self.root, text="( Ensure phone is on same WiFi )", fg="#555", bg="#0f0f0f", font=("Arial", 8, "italic")).pack()
@@ -42,64 +67,205 @@ class DMicServer:
         self.btn_toggle = ttk.Button(ctrl_frame, text="START SERVER", command=self.toggle_server)
         self.btn_toggle.pack(side="left", padx=10)
 
+        # Read when the server starts: shallow buffers for 5 ms phone frames.
+        self.low_latency = tk.BooleanVar(value=LOW_LATENCY)
+        tk.Checkbutton(ctrl_frame, text="LOW LATENCY", variable=self.low_latency, fg="#888",
+                       bg="#0f0f0f", selectcolor="#1a1a1a", activebackground="#0f0f0f",
+                       font=("Consolas", 8)).pack(side="left")
+
         # VU Meter
         self.vu_canvas = tk.Canvas(self.root, width=300, height=20, bg="#1a1a1a", highlightthickness=0)
         self.vu_canvas.pack(pady=10)
         self.vu_bar = self.vu_canvas.create_rectangle(0, 0, 0, 20, fill="#00ffcc")
+        self.vu_hold = self.vu_canvas.create_line(0, 0, 0, 20, fill="#ffffff")
+
+        self.stats_label = tk.Label(self.root, text="", fg="#555", bg="#0f0f0f", font=("Consolas", 8))
+        self.stats_label.pack()
+
+        # Sources
+        self.src_frame = tk.Frame(self.root, bg="#0f0f0f")
+        self.src_frame.pack(fill="x", padx=40, pady=5)
+        self.src_rows = {}
+
+        self._vu_shown = None
+        self.root.after(VU_REFRESH_MS, self.update_vu)
+        self.root.bind('<Control-p>', self.print_reports)
+        self.root.after_idle(self.on_shown)
 
-    def update_vu(self, data):
-        volume = np.linalg.norm(data) * 10
-        width = min(300, volume)
-        self.vu_canvas.coords(self.vu_bar, 0, 0, width, 20)
-        # Dynamic color from green to red based on peak
-        color = "#00ffcc" if width < 200 else "#ffcc00" if width < 280 else "#ff3333"
-        self.vu_canvas.itemconfig(self.vu_bar, fill=color)
+    def on_shown(self):
+        # Runs once the window has been drawn.
+        if self.startup_bench:
+            print(f"window {time.time():.6f}", flush=True)
+        threading.Thread(target=_load_engine, name="DMIC-Preload", daemon=True).start()
+        self.ip_label.config(text=f"IP ADDRESS: {get_local_ip()}")
+        if self.startup_bench:
+            self.toggle_server()
+
+    @staticmethod
+    def vu_width(level):
+        # -60..0 dBFS across the 300 px bar
+        if level <= 0.0:
+            return 0
+        return int(min(300, max(0, (20 * math.log10(level) + 60) * 5)))
+
+    def update_vu(self):
+        t = self.prof.start()
+        engine = self.engine
+        peak, rms, hold = engine.level() if engine else (0.0, 0.0, 0.0)
+        width, mark = self.vu_width(rms), self.vu_width(hold)
+        if (width, mark) != self._vu_shown:
+            self._vu_shown = (width, mark)
+            self.vu_canvas.coords(self.vu_bar, 0, 0, width, 20)
+            self.vu_canvas.coords(self.vu_hold, mark, 0, mark, 20)
+            # Dynamic color from green to red based on level
+            color = "#00ffcc" if width < 200 else "#ffcc00" if width < 280 else "#ff3333"
+            self.vu_canvas.itemconfig(self.vu_bar, fill=color)
+        if (engine or self.error) and self.startup_bench:
+            self.root.destroy()
+            return
+        if self.error:
+            self.status_label.config(text="STATUS: RECEIVER ERROR", fg="#ff3333")
+            self.stats_label.config(text=self.error[:64])
+        elif engine:
+            self.stats_label.config(text=f"UNDERRUNS {engine.underruns} | OVERRUNS {engine.overruns}")
+            self.update_sources(engine)
+        self.prof.lap('gui', t)
+        self.root.after(VU_REFRESH_MS, self.update_vu)
+
+    def update_sources(self, engine):
+        sources = {s.key: s for s in list(engine.sources.values())}
+        for key in [k for k in self.src_rows if k not in sources]:
+            self.src_rows.pop(key)[0].destroy()
+        for key, src in sources.items():
+            if key not in self.src_rows:
+                self.src_rows[key] = self.add_source_row(engine, src)
+            row, label = self.src_rows[key]
+            span = time.monotonic() - src.first_seen
+            text = (f"{src.name}  {src.rate // 1000}k {protocol.FMT_NAMES.get(src.fmt, '?')}"
+                    f"  {src.jb.frame_len * 1000 / src.rate:.1f}ms"
+                    f" {src.packets / span if span > 0 else 0:.0f}/s")
+            lat = engine.latency(src)
+            if lat:
+                # Mouth-to-ear, then network / buffer / device shares.
+                text += f"  {sum(lat) * 1000:.0f}ms ({'/'.join(f'{x * 1000:.0f}' for x in lat)})"
+            label.config(text=text)
+        if engine.device_error:
+            # Senders are arriving but the sound card will not open; retried every second.
+            self.status_label.config(text="STATUS: AUDIO DEVICE ERROR", fg="#ff3333")
+            self.stats_label.config(text=engine.device_error[:64])
+        elif sources:
+            out = engine.playout
+            self.status_label.config(text=f"STATUS: {len(sources)} SOURCE(S) @ {out.rate} Hz", fg="#00ffcc")
+        elif self.running:
+            self.status_label.config(text="STATUS: LISTENING...", fg="#00ffcc")
+
+    def add_source_row(self, engine, src):
+        key = src.key
+        row = tk.Frame(self.src_frame, bg="#0f0f0f")
+        row.pack(fill="x")
+        label = tk.Label(row, text="", fg="#888", bg="#0f0f0f", font=("Consolas", 8), anchor="w")
+        label.pack(side="left")
+        muted = tk.BooleanVar(value=src.muted)
+        tk.Checkbutton(row, text="MUTE", variable=muted, fg="#888", bg="#0f0f0f", selectcolor="#1a1a1a",
+                       font=("Consolas", 8), command=lambda: self.engine_call(engine.set_mute, key, muted.get())).pack(side="right")
+        gain = tk.Scale(row, from_=0, to=200, orient="horizontal", showvalue=False, length=80, bg="#0f0f0f",
+                        highlightthickness=0, troughcolor="#1a1a1a",
+                        command=lambda v: self.engine_call(engine.set_gain, key, float(v) / 100))
+        gain.set(int(src.gain * 100))
+        gain.pack(side="right")
+        return row, label
+
+    def print_reports(self, event=None):
+        # Stage profile (if enabled) and what the DSP chain costs per stream.
+        budget = self.engine.dsp_budget if self.engine else None
+        for text in (self.prof.report(), budget and budget.stages and budget.report()):
+            if text:
+                print(text, flush=True)
+
+    def engine_call(self, fn, *args):
+        # Engine state belongs to the receiver loop; GUI changes are queued onto it.
+        rx = self.rx
+        if rx:
+            rx.call(fn, *args)
+        else:
+            fn(*args)
 
-    def audio_receiver(self):
+    def audio_receiver(self, sock):
+        _engine_ready.wait()
+        engine = None
         try:
-            self.stream = sd.OutputStream(
-                samplerate=RATE,
-                channels=CHANNELS,
-                dtype='int16'
-            )
-            self.stream.start()
-            
-            while self.running:
-                data, addr = self.sock.recvfrom(CHUNK * 4)
-                audio_array = np.frombuffer(data, dtype=np.int16)
-                self.stream.write(audio_array)
-                self.root.after(0, self.update_vu, audio_array)
+            if AsyncReceiver is None:
+                raise RuntimeError("audio engine failed to load")
+            if not self.running or self.sock is not sock:
+                return      # stopped (or restarted) while the engine loaded
+            low = self.low_latency.get()
+            # A bad DSP_CHAIN, say, raises here; it must not leave the
+            # window on LISTENING with the socket still bound.
+            engine = ReceiverEngine(
+                prof=self.prof, min_delay_ms=LL_JITTER_MIN_MS if low else JITTER_MIN_MS,
+                cushion_ms=LL_CUSHION_MS if low else PLAYOUT_CUSHION_MS)
+            rx = AsyncReceiver(engine, [sock], self.prof,
+                               (LL_POLL_MS if low else JITTER_POLL_MS) / 1000.0)
+            if METRICS_PORT:
+                try:
+                    if self.metrics is None:
+                        from metrics import MetricsServer
+                        self.metrics = MetricsServer(engine, METRICS_PORT, METRICS_HOST).start()
+                    self.metrics.engine = engine
+                except OSError as e:
+                    print(f"Metrics Error: {e}")
+            if self.startup_bench:
+                # Before publishing the engine: update_vu exits the bench once it sees one.
+                print(f"listening {time.time():.6f}", flush=True)
+            self.engine, self.rx = engine, rx
+            if not self.running:
+                rx.stop()   # stopped between the check above and publishing rx
+            rx.run()
         except Exception as e:
             print(f"Receiver Error: {e}")
+            self.error = str(e) or type(e).__name__
         finally:
-            if self.stream:
-                self.stream.stop()
-                self.stream.close()
+            if engine is not None:
+                engine.close()
+            sock.close()
 
     def toggle_server(self):
         if not self.running:
             try:
                 self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
                 self.sock.bind(('', PORT))
+                protocol.set_rcvbuf(self.sock, RCVBUF_BYTES)
+                # The receiver thread builds the engine once the background
+                # import is done; datagrams queue in the socket meanwhile.
+                self.engine = None
+                self.error = None
                 self.running = True
                 self.status_label.config(text="STATUS: LISTENING...", fg="#00ffcc")
                 self.btn_toggle.config(text="STOP SERVER")
                 
-                self.thread = threading.Thread(target=self.audio_receiver, daemon=True)
+                self.thread = threading.Thread(target=self.audio_receiver, args=(self.sock,),
+                                               daemon=True)
                 self.thread.start()
             except Exception as e:
                 messagebox.showerror("D-MIC Error", f"Failed to bind port {PORT}: {e}")
         else:
             self.running = False
+            self.error = None
+            if self.rx:
+                self.rx.stop()
+                self.rx = None
+            if self.thread:
+                self.thread.join(timeout=1.0)   # the loop ends within one JITTER_POLL_MS tick
             if self.sock:
-                self.sock.close()
+                self.sock.close()   # still waiting for the engine to load
             self.status_label.config(text="STATUS: OFFLINE", fg="#ff3333")
             self.btn_toggle.config(text="START SERVER")
-            self.vu_canvas.coords(self.vu_bar, 0, 0, 0, 20)
 
     def run(self):
         self.root.mainloop()
 
 if __name__ == "__main__":
-    server = DMicServer()
+    # --startup-bench: print time-to-window and time-to-listening as epoch
+    # seconds, then exit. Driven by bench_startup.py.
+    server = DMicServer(startup_bench='--startup-bench' in sys.argv)
     server.run()
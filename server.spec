@@ -1,38 +1,78 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+# pyinstaller server.spec              -> dist/server/server.exe (onedir, fast start)
+# set DMIC_ONEFILE=1 first             -> dist/server.exe (single file, slow start)
+#
+# A onefile build unpacks itself to a temp folder on every launch, which
+# is most of its cold-start time. The onedir build runs in place. UPX is
+# off for the same reason: every compressed DLL is inflated at load.
 
+import os
+
+ONEFILE = bool(os.environ.get('DMIC_ONEFILE'))
 
 a = Analysis(
-    ['e:/var/d-mic/server.py'],
+    ['server.py'],
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['engine', 'receiver'],   # imported lazily, after the window is up
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Phone-side and dev-only packages that would otherwise be swept in.
+    excludes=['kivy', 'jnius', 'android', 'matplotlib', 'scipy', 'PIL',
+              'IPython', 'pytest'],
     noarchive=False,
-    optimize=0,
+    optimize=1,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='server',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if ONEFILE:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='server',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='server',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='server',
+    )
@@ -0,0 +1,20 @@
+"""
+Adaptation ladder tests: which codec and parity a sender steps through
+as receiver reports get worse.
+"""
+from adapt import Adapter
+from protocol import FMT_PCM16, FMT_ULAW, FMT_ULAW4
+
+
+def test_ladder_never_gives_up_requested_parity():
+    # Stepping down under loss must not turn parity off or weaken it.
+    for group in (2, 4, 8):
+        levels = Adapter(FMT_PCM16, group).levels
+        assert all(0 < g <= group for _, g in levels)
+    assert Adapter(FMT_PCM16, 4).levels == [(FMT_PCM16, 4), (FMT_ULAW, 4), (FMT_ULAW4, 4),
+                                             (FMT_ULAW4, 2)]
+
+
+def test_ladder_without_fec_starts_unprotected():
+    assert Adapter(FMT_PCM16).levels == [(FMT_PCM16, 0), (FMT_ULAW, 0), (FMT_ULAW, 4),
+                                          (FMT_ULAW4, 4), (FMT_ULAW4, 2)]
@@ -0,0 +1,60 @@
+"""
+Codec round trips, mono to planar, against an error bound per format.
+"""
+import numpy as np
+import pytest
+
+import codec
+import protocol
+from protocol import FMT_PCM16, FMT_ULAW, FMT_ULAW4
+
+FRAMES = 1000       # not a whole number of ulaw4 blocks
+SNR_DB = {FMT_ULAW: 34, FMT_ULAW4: 17}
+
+
+def signal(channels):
+    t = np.arange(FRAMES)[:, None]
+    x = 12000 * np.sin(2 * np.pi * t * (1 + np.arange(channels)) / 97)
+    return np.rint(x).astype('<i2')
+
+
+def close(fmt, got, want):
+    if fmt == FMT_PCM16:
+        return np.array_equal(got, want)
+    # SNR floor: mu-law measures ~38 dB here, ulaw4 ~20 dB.
+    want = want.astype(np.float64)
+    noise = ((got - want) ** 2).sum()
+    return 10 * np.log10((want ** 2).sum() / noise) > SNR_DB[fmt]
+
+
+@pytest.mark.parametrize('fmt', [FMT_PCM16, FMT_ULAW, FMT_ULAW4])
+@pytest.mark.parametrize('channels', [1, 2])
+def test_interleaved_round_trip(fmt, channels):
+    x = signal(channels)
+    y = codec.decode(fmt, codec.encode(fmt, x.tobytes()), channels)
+    assert y.shape == (FRAMES, channels)
+    assert close(fmt, y, x)
+
+
+@pytest.mark.parametrize('fmt', [FMT_PCM16, FMT_ULAW, FMT_ULAW4])
+def test_planar_round_trip(fmt):
+    x = signal(3)
+    wire = protocol.layout(x.tobytes(), 3, planar=True)
+    y = codec.decode(fmt, codec.encode(fmt, wire), 3, planar=True)
+    assert y.shape == (FRAMES, 3) and close(fmt, y, x)
+    # Dropped channels come back as the first `keep`, for every format.
+    y = codec.decode(fmt, codec.encode(fmt, wire), 3, planar=True, keep=2)
+    assert y.shape == (FRAMES, 2) and close(fmt, y, x[:, :2])
+
+
+def test_ulaw_matches_the_table_encoder():
+    # The numpy encoder and the phone's lookup table agree bit for bit.
+    x = np.arange(-32768, 32768, 7, dtype='<i2')
+    assert codec.encode(FMT_ULAW, x.tobytes()) == \
+        bytes(map(codec._ulaw_encode_table().__getitem__, x.view('<u2').tolist()))
+
+
+@pytest.mark.parametrize('payload', [b'', b'\x01'])
+def test_ulaw4_too_short_for_its_count(payload):
+    with pytest.raises(ValueError):
+        codec._ulaw4_decode(payload)
@@ -0,0 +1,59 @@
+"""
+Phone client logger tests. dmic_client.py needs Kivy to import, so the
+logger is lifted out of its source on its own.
+"""
+import ast
+import os
+
+import pytest
+
+
+@pytest.fixture
+def logger(tmp_path):
+    with open(os.path.join(os.path.dirname(__file__), 'dmic_client.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            body.append(node)
+        elif isinstance(node, ast.Assign) and node.targets[0].id.startswith('_LOG_'):
+            body.append(node)
+        elif isinstance(node, ast.ClassDef) and node.name == '_AsyncLog':
+            body.append(node)
+            break
+    ns = {}
+    exec(compile(ast.Module(body, []), 'dmic_client.py', 'exec'), ns)
+    return ns, ns['_AsyncLog'](str(tmp_path / 'dmic_log.txt'))
+
+
+def read(log):
+    with open(log.path) as f:
+        return f.read().splitlines()
+
+
+def test_repeats_are_rate_limited_and_counted(logger, capsys):
+    ns, log = logger
+    burst = ns['_LOG_BURST']
+    for _ in range(burst + 7):
+        log.put("send failed")
+    log.put("other")
+    log.flush()
+    assert read(log).count("send failed") == burst
+    # The count held back is written by an explicit flush, e.g. on exit.
+    log.flush(suppressed=True)
+    assert read(log)[-1] == "send failed  (x7 more suppressed)"
+    log.flush(suppressed=True)
+    assert read(log)[-1] == "send failed  (x7 more suppressed)"
+    assert "other" in capsys.readouterr().out
+
+
+def test_log_rotates_past_its_size_limit(logger, capsys):
+    ns, log = logger
+    ns['_LOG_MAX_BYTES'] = 100
+    log.put("x" * 150)
+    log.flush()
+    log.put("after")
+    log.flush()
+    assert read(log) == ["after"]
+    with open(log.path + '.1') as f:
+        assert f.read().splitlines() == ["x" * 150]
@@ -0,0 +1,59 @@
+"""
+Drift controller regression tests.
+
+A simulated lane: frames are written at the sender's pace, a few ms
+late as the service loop gets to them, resampled by the controller's
+factor, and read by a device in 256-frame blocks, so the slack carries
+the same block-sized noise a sound card gives it.
+"""
+import random
+
+from drift import DEADBAND_PPM, DriftControl
+
+RATE = 44100
+FRAMES = 1024
+BLOCK = 256
+LEAD = 2048
+
+
+def simulate(skew_ppm, seconds, restart_at=None):
+    """Run a stream with the sender's clock off by `skew_ppm`; returns (control, slacks)."""
+    dc = DriftControl(RATE)
+    rnd = random.Random(1)
+    period = FRAMES / RATE / (1 + skew_ppm * 1e-6)
+    written = pos = 0.0
+    slacks = []
+    t, restarted = 0.0, False
+    while t < seconds:
+        now = t + rnd.uniform(0, 0.005)
+        r = int(now * RATE) // BLOCK * BLOCK
+        if not written or (restart_at is not None and t >= restart_at and not restarted):
+            # (Re)start at the lead; a restart also loses some of what was queued.
+            restarted = bool(written)
+            pos = r + LEAD
+            if restarted:
+                dc.restart()
+        slack = pos - r - LEAD
+        slacks.append((t, slack))
+        pos += FRAMES * dc.factor
+        written += 1
+        dc.update(slack, now)
+        t += period
+    return dc, slacks
+
+
+def test_zero_skew_is_left_alone():
+    # The first write after a (re)start always sits on the lead while the
+    # device's blocks put the settled depth elsewhere; that offset, and the
+    # block noise, must not be read as drift.
+    dc, _ = simulate(0, 120, restart_at=60)
+    assert abs(dc.ppm) < DEADBAND_PPM
+    assert dc.factor == 1.0
+
+
+def test_skew_is_measured_and_depth_held():
+    dc, slacks = simulate(300, 120, restart_at=40)
+    assert abs(dc.ppm - 300) < 20
+    late = [s for t, s in slacks if t > 100]
+    settled = [s for t, s in slacks if 42 < t < 44]
+    assert abs(sum(late) / len(late) - sum(settled) / len(settled)) < 0.005 * RATE
@@ -0,0 +1,65 @@
+"""
+DSP stage and chain tests.
+"""
+import numpy as np
+import pytest
+
+import dsp
+from config import LIMIT_DB
+
+RATE = 48000
+N = 480
+
+
+def blocks(x):
+    return [x[i:i + N] for i in range(0, len(x), N)]
+
+
+def test_highpass_removes_dc():
+    t = np.arange(RATE)[:, None]
+    tone = 3000 * np.sin(2 * np.pi * 1000 * t / RATE)
+    x = (5000 + tone).astype(np.float32)
+    hp = dsp.HighPass(RATE)
+    y = np.concatenate([hp.process(b.copy()) for b in blocks(x)])
+    tail = y[RATE // 2:]
+    assert abs(tail.mean()) < 10
+    # The 1 kHz tone, far above the corner, goes through.
+    assert np.abs(tail).max() == pytest.approx(3000, rel=0.05)
+
+
+def test_limiter_holds_the_ceiling():
+    t = np.arange(RATE)[:, None]
+    x = (32000 * np.sin(2 * np.pi * 440 * t / RATE) * np.linspace(0.1, 1.5, RATE)[:, None])
+    lim = dsp.Limiter(RATE)
+    y = np.concatenate([lim.process(b.astype(np.float32)) for b in blocks(x)])
+    ceiling = dsp.FULL * 10 ** (LIMIT_DB / 20)
+    assert np.abs(y).max() <= ceiling + 1e-3
+
+
+def test_parse():
+    assert dsp.parse('') == dsp.parse('none') == []
+    assert dsp.parse(' highpass, limiter ') == ['highpass', 'limiter']
+    with pytest.raises(ValueError):
+        dsp.parse('bogus')
+    with pytest.raises(ValueError):
+        dsp.parse('highpass,bogus')
+
+
+def test_budget_shares_time_per_second_of_audio():
+    b = dsp.Budget(limit_pct=5.0)
+    b.add('highpass', 10_000_000, 1.0)      # 10 ms of CPU for a second of audio
+    b.add('limiter', 30_000_000, 1.0)
+    assert b.share('highpass') == pytest.approx(1.0)
+    assert b.share() == pytest.approx(4.0)
+    assert 'OVER BUDGET' not in b.report()
+    b.add('limiter', 40_000_000, 0.0)
+    assert b.share() == pytest.approx(8.0)
+    assert 'OVER BUDGET' in b.report()
+
+
+def test_chain_charges_every_stage():
+    chain = dsp.Chain('highpass,limiter', RATE)
+    out = chain.process(np.zeros((N, 2), dtype=np.int16))
+    assert out.shape == (N, 2)
+    assert set(chain.budget.stages) == {'highpass', 'limiter'}
+    assert not dsp.Chain('', RATE)
@@ -0,0 +1,150 @@
+"""
+Receive-path regression tests. They drive a ReceiverEngine with a
+clock-driven null sink in real time, so each takes about as long as the
+audio it sends.
+"""
+import time
+
+import pytest
+
+import codec
+import protocol
+from engine import ReceiverEngine
+from fec import ParityEncoder
+
+RATE = 44100
+FRAMES = 1024
+ADDR = ('127.0.0.1', 9)
+
+
+@pytest.fixture
+def engine():
+    engine = ReceiverEngine(sink='null', dsp_chain='')
+    yield engine
+    engine.close()
+
+
+def stream(engine, count, ssrc=1, fmt=protocol.FMT_PCM16, every=None):
+    """
+    Send `count` steady frames paced at the sample rate, servicing as a
+    front end would. Returns once the last frame is handed in, before
+    the slots after it could be concealed.
+    """
+    payload = bytes(FRAMES * 2)
+    period = FRAMES / RATE
+    start = time.monotonic()
+    for i in range(count):
+        due = start + i * period
+        while time.monotonic() < due:
+            engine.service()
+            time.sleep(0.002)
+        engine.handle(protocol.pack(protocol.KIND_AUDIO, fmt, 1, 0, ssrc, i, i * FRAMES, RATE)
+                      + payload, ADDR)
+        if every:
+            every(i)
+
+
+def test_steady_stream_is_not_concealed(engine):
+    # Frames are released on their deadline, not a playout cushion ahead of
+    # it, so a steady stream never has a slot declared lost before it lands.
+    stream(engine, 40)
+    src = engine.sources[1]
+    assert src.jb.lost == 0
+    assert src.jb.late == 0
+    assert src.plc.concealed == 0
+
+
+def test_fec_delay_is_dropped_with_parity(engine):
+    # Parity raises the jitter floor by a group; once the sender stops
+    # sending it, frames must not keep waiting for parity that never comes.
+    enc, payload = ParityEncoder(4), bytes(FRAMES * 2)
+    for i in range(80):
+        engine.handle(protocol.pack(protocol.KIND_AUDIO, protocol.FMT_PCM16, 1, 0, 1, i,
+                                    i * FRAMES, RATE) + payload, ADDR)
+        parity = enc.add(i, i * FRAMES, payload) if i < 16 else None
+        if parity:
+            seq, ts, data = parity
+            engine.handle(protocol.pack(protocol.KIND_FEC, protocol.FMT_PCM16, 1, 0, 1, seq,
+                                        ts, RATE) + data, ADDR)
+        src = engine.sources[1]
+        if i in (15, 30):
+            # A few missing parity blocks are loss, not FEC turned off.
+            assert src.jb.min_delay > src.min_delay
+    assert src.fec.group == 0
+    assert src.jb.min_delay == src.min_delay
+
+
+def test_bogus_format_is_refused(engine):
+    # A rate or channel count out of range never reaches _open() or Source.
+    for rate, channels in ((0, 1), (4000000000, 1), (RATE, 0), (RATE, 200)):
+        data = protocol.pack(protocol.KIND_AUDIO, 0, channels, 0, 7, 0, 0, rate) + bytes(100)
+        assert engine.handle(data, ADDR) is None
+    assert engine.malformed == 4
+    assert not engine.sources and engine.playout is None
+
+
+def test_short_ulaw4_payload_is_malformed(engine):
+    # Too short to hold its sample count: counted, not raised into the loop.
+    for payload in (b'', b'\x01'):
+        engine.handle(protocol.pack(protocol.KIND_AUDIO, protocol.FMT_ULAW4, 1, 0, 1, 0, 0, RATE)
+                      + payload, ADDR)
+    assert engine.sources[1].malformed == 2
+
+
+def test_empty_payload_is_malformed(engine):
+    # A sane header with no samples never reaches the jitter buffer, PLC or meter.
+    ulaw4_empty = (0).to_bytes(2, 'little')
+    for fmt, payload in ((protocol.FMT_PCM16, b''), (protocol.FMT_ULAW, b''),
+                         (protocol.FMT_ULAW4, ulaw4_empty)):
+        engine.handle(protocol.pack(protocol.KIND_AUDIO, fmt, 1, 0, 1, 0, 0, RATE) + payload,
+                      ADDR)
+    src = engine.sources[1]
+    assert src.malformed == 3
+    assert src.jb.received == 0
+    engine.service()
+
+
+def test_legacy_datagrams_are_mono(engine, monkeypatch):
+    # CHANNELS is what this build's phones capture, not what old clients send.
+    monkeypatch.setattr('engine.CHANNELS', 2)
+    for _ in range(2):
+        engine.handle(bytes(FRAMES * 2), ADDR)
+    src = engine.sources[ADDR]
+    assert src.channels == 1
+    assert src.jb.frame_len == FRAMES
+
+
+def test_device_open_failure_is_reported(engine, monkeypatch):
+    # The datagram is dropped, the reason kept for the front end, and the
+    # device is not reopened on every packet.
+    opened = []
+
+    def refuse(*args, **kwargs):
+        opened.append(args)
+        raise RuntimeError("no such device")
+
+    monkeypatch.setattr('engine.Playout', refuse)
+    engine.sink = None
+    data = protocol.pack(protocol.KIND_AUDIO, protocol.FMT_PCM16, 1, 0, 1, 0, 0, RATE)
+    for _ in range(3):
+        engine.handle(data + bytes(FRAMES * 2), ADDR)
+    assert engine.device_error == "no such device"
+    assert len(opened) == 1
+    assert not engine.sources and engine.playout is None
+
+
+@pytest.mark.parametrize('fmt', [protocol.FMT_PCM16, protocol.FMT_ULAW4])
+def test_decoded_frame_is_copied_only_off_the_receive_buffer(engine, monkeypatch, fmt):
+    # pcm16 decodes to a view of the datagram, so it is copied out; ulaw4
+    # already decodes into a new array, which is kept rather than copied again.
+    decoded, real = [], codec.decode
+
+    def decode(*args):
+        decoded.append(real(*args))
+        return decoded[-1]
+
+    monkeypatch.setattr(codec, 'decode', decode)
+    payload = codec.encode(fmt, bytes(FRAMES * 2))
+    engine.handle(protocol.pack(protocol.KIND_AUDIO, fmt, 1, 0, 1, 0, 0, RATE) + payload, ADDR)
+    (frame,) = [item[1] for item in engine.sources[1].jb._frames.values()]
+    assert (frame is decoded[0]) == (fmt == protocol.FMT_ULAW4)
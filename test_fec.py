@@ -0,0 +1,64 @@
+"""
+XOR parity recovery tests.
+"""
+from fec import PARITY_TIMEOUT_S, ParityDecoder, ParityEncoder
+
+RATE = 48000
+N = 480         # samples per frame
+GROUP = 4
+
+
+def frames(count, start=0):
+    # Unequal lengths, so x_len and the zero padding are exercised too.
+    return [(s, s * N, bytes([s & 0xFF]) * (100 + s % 3)) for s in range(start, start + count)]
+
+
+def send(dec, enc, sent, drop=()):
+    """Feed `sent` through encoder and decoder, losing `drop`. Returns rebuilt frames."""
+    out = []
+    for seq, ts, payload in sent:
+        if seq not in drop:
+            r = dec.add_frame(seq, ts, payload)
+            if r:
+                out.append(r)
+        p = enc.add(seq, ts, payload)
+        if p:
+            r = dec.add_parity(p[0], p[2])
+            if r:
+                out.append(r)
+    return out
+
+
+def test_single_loss_in_a_group_is_rebuilt():
+    dec, enc = ParityDecoder(RATE), ParityEncoder(GROUP)
+    sent = frames(3 * GROUP)
+    send(dec, enc, sent[:GROUP])        # parity now seen
+    lost = sent[GROUP + 1]
+    assert send(dec, enc, sent[GROUP:], drop={lost[0]}) == [lost]
+    assert dec.recovered == 1
+
+
+def test_two_losses_in_a_group_are_not_rebuilt():
+    dec, enc = ParityDecoder(RATE), ParityEncoder(GROUP)
+    sent = frames(2 * GROUP)
+    send(dec, enc, sent[:GROUP])
+    assert send(dec, enc, sent[GROUP:], drop={GROUP, GROUP + 2}) == []
+
+
+def test_loss_before_the_first_parity_is_not_rebuilt():
+    # Until parity shows up the stream may carry none, so nothing is held.
+    dec, enc = ParityDecoder(RATE), ParityEncoder(GROUP)
+    assert send(dec, enc, frames(GROUP), drop={1}) == []
+    assert dec.recovered == 0 and dec.group == GROUP
+
+
+def test_state_is_dropped_once_parity_stops():
+    dec, enc = ParityDecoder(RATE), ParityEncoder(GROUP)
+    send(dec, enc, frames(GROUP))
+    assert dec.group == GROUP
+    # The sender turns FEC off: plain frames for longer than the timeout.
+    count = int(RATE * PARITY_TIMEOUT_S) // N + 2
+    for seq, ts, payload in frames(count, start=GROUP):
+        dec.add_frame(seq, ts, payload)
+    assert dec.group == 0
+    assert not dec._frames and not dec._parity
@@ -0,0 +1,54 @@
+"""
+Headless front end tests.
+"""
+import argparse
+import json
+import socket
+
+import pytest
+
+import bench_startup
+import headless
+from config import METRICS_HOST
+from headless import metrics_spec, port_list
+
+
+def test_port_list():
+    assert port_list('50005') == [50005]
+    assert port_list('50005, 50006,') == [50005, 50006]
+    assert port_list('0') == [0]        # the OS picks a free port
+    for bad in (',', '65536', '-1'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            port_list(bad)
+
+
+def test_startup_bench_reaches_listening(capsys):
+    # bench_startup launches headless.py on port 0; it must get as far as
+    # its "listening" line rather than failing on its arguments. The budget
+    # is loose: this checks that it starts, not how fast.
+    assert bench_startup.main(['--target', 'headless', '--runs', '1', '--json',
+                               '--listen-budget-ms', '30000']) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result['listening']['samples'] == 1
+
+
+def test_metrics_spec():
+    assert metrics_spec('9100') == (METRICS_HOST, 9100)
+    assert metrics_spec('0.0.0.0:9100') == ('0.0.0.0', 9100)
+    for bad in ('', 'host:', ':x', '70000'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            metrics_spec(bad)
+
+
+def test_busy_metrics_port_fails_cleanly(capsys):
+    # One line and status 1, not a traceback with the UDP port left bound.
+    busy = socket.socket()
+    busy.bind(('127.0.0.1', 0))
+    busy.listen()
+    try:
+        port = busy.getsockname()[1]
+        assert headless.main(['--port', '0', '--sink', 'null', '--stats', '0',
+                              '--metrics', f'127.0.0.1:{port}']) == 1
+    finally:
+        busy.close()
+    assert 'Failed to serve metrics' in capsys.readouterr().err
@@ -0,0 +1,29 @@
+"""
+Jitter buffer tests, on a simulated clock.
+"""
+from config import MAX_CONCEAL_MS, PLC_FADE_MS
+from jitter import JitterBuffer
+
+RATE = 44100
+
+
+def burst(frame_len, gap):
+    """Lose `gap` frames after 40 good ones; returns how many slots were concealed."""
+    jb = JitterBuffer(RATE, max_conceal=max(MAX_CONCEAL_MS, PLC_FADE_MS) / 1000.0)
+    frame, period = [0] * frame_len, frame_len / RATE
+    concealed = 0
+    for seq in list(range(40)) + list(range(40 + gap, 50 + gap)):
+        now = seq * period
+        jb.push(seq, seq * frame_len, frame, now)
+        concealed += sum(f is None for _, f in jb.pop(now))
+    return concealed
+
+
+def test_concealment_is_capped_in_time():
+    # 5 ms frames are concealed for as long as 23 ms ones, which is long
+    # enough for the PLC fade to reach silence.
+    cap_ms = max(MAX_CONCEAL_MS, PLC_FADE_MS)
+    assert burst(220, 20) == 20                             # 100 ms, all filled
+    assert burst(220, 60) * 220 * 1000 / RATE <= cap_ms
+    assert burst(220, 60) * 220 * 1000 / RATE >= PLC_FADE_MS
+    assert burst(1024, 20) == cap_ms * RATE // (1000 * 1024)
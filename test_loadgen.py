@@ -0,0 +1,17 @@
+"""
+Load generator tests.
+"""
+import array
+
+import loadgen
+
+
+def test_dropped_sends_report_bytes():
+    # An int16 buffer's len() counts samples, not the bytes sendmsg() reports.
+    payload = array.array('h', [0] * 10)
+    sock = loadgen.LossySocket(loss=1.0)
+    try:
+        assert sock.sendmsg((b'head', payload), (), 0, ('127.0.0.1', 9)) == 24
+        assert sock.sendto(payload, ('127.0.0.1', 9)) == 20
+    finally:
+        sock.close()
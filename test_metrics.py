@@ -0,0 +1,56 @@
+"""
+Metrics export tests.
+"""
+import json
+import re
+
+import pytest
+
+import protocol
+from engine import ReceiverEngine
+from metrics import _ENGINE, _SOURCE, collect, prometheus, to_json
+
+RATE = 44100
+FRAMES = 1024
+SSRC = 0x1234abcd
+
+
+@pytest.fixture
+def engine():
+    engine = ReceiverEngine(sink='null', dsp_chain='')
+    payload = bytes(FRAMES * 2)
+    for i in range(3):
+        engine.handle(protocol.pack(protocol.KIND_AUDIO, protocol.FMT_PCM16, 1, 0, SSRC, i,
+                                    i * FRAMES, RATE) + payload, ('127.0.0.1', 9))
+    yield engine
+    engine.close()
+
+
+def test_prometheus_names_and_labels(engine):
+    text = prometheus(collect(engine))
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    for name in _ENGINE:
+        assert f"dmic_{name}" in samples
+    assert samples['dmic_packets'] == 3
+    assert samples['dmic_sources_active'] == 1
+    (labels,) = set(re.findall(r'dmic_source_packets(\{.*\})', text))
+    assert re.fullmatch(r'\{source="[^"]+",ssrc="1234abcd"\}', labels)
+    for name in _SOURCE:
+        assert f"dmic_source_{name}{labels}" in samples
+    assert samples[f"dmic_source_packets{labels}"] == 3
+    le_inf = labels[:-1] + ',le="+Inf"}'
+    assert samples[f"dmic_source_decode_seconds_bucket{le_inf}"] == \
+        samples[f"dmic_source_decode_seconds_count{labels}"] == 3
+
+
+def test_json_parses(engine):
+    data = json.loads(to_json(collect(engine)))
+    assert data['packets'] == 3
+    (src,) = data['sources']
+    assert src['ssrc'] == '1234abcd'
+    assert src['decode_seconds']['count'] == 3
+    assert src['decode_seconds']['buckets'][-1] == ['+Inf', 3]
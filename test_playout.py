@@ -0,0 +1,32 @@
+"""
+Mix ring tests, driven by hand instead of a device callback.
+"""
+import numpy as np
+
+from playout import MixRing
+
+
+def test_write_stays_two_blocks_ahead_of_the_reader():
+    # The callback may be clearing the block after the cursor a lane last
+    # read, so a lane closer than two blocks restarts instead of mixing there.
+    ring = MixRing(4096, 1, cushion=0)
+    out = np.zeros((128, 1), dtype=np.int16)
+    ring.read_into(out)                 # guard becomes the 128-frame block
+    lane = ring.lane()
+    lane.write(np.ones((64, 1), dtype=np.float32))
+    assert lane.pos - 64 - ring._r >= 2 * ring.guard
+    lane.pos = ring._r + 3 * ring.guard // 2
+    lane.write(np.ones((64, 1), dtype=np.float32))
+    assert lane.late == 1
+    assert lane.pos - 64 - ring._r >= 2 * ring.guard
+
+
+def test_steady_writes_are_not_late():
+    ring = MixRing(4096, 1, cushion=0)
+    out = np.zeros((128, 1), dtype=np.int16)
+    ring.read_into(out)                 # the device sets the block size first
+    lane = ring.lane()
+    for _ in range(50):
+        lane.write(np.ones((128, 1), dtype=np.float32))
+        ring.read_into(out)
+    assert lane.late == 0 and ring.underruns == 0
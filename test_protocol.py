@@ -0,0 +1,49 @@
+"""
+Wire format tests.
+"""
+import socket
+
+import protocol
+from config import CHUNK, MAX_PACKET
+from fec import ParityEncoder
+
+
+def test_largest_datagram_fits_the_receive_buffer():
+    # A sender the server never answered keeps all its channels, up to
+    # MAX_WIRE_CHANNELS; the reader must not silently truncate its datagrams.
+    payload = protocol.STAMP.pack(0) + bytes(protocol.MAX_WIRE_CHANNELS * CHUNK * 2)
+    audio = protocol.pack(protocol.KIND_AUDIO, protocol.FMT_PCM16, protocol.MAX_WIRE_CHANNELS,
+                          protocol.FLAG_STAMP, 1, 0, 0, 44100) + payload
+    seq, ts, parity = ParityEncoder(1).add(0, 0, payload)
+    fec = protocol.pack(protocol.KIND_FEC, protocol.FMT_PCM16, protocol.MAX_WIRE_CHANNELS,
+                        protocol.FLAG_STAMP, 1, seq, ts, 44100) + parity
+    assert max(len(audio), len(fec)) <= MAX_PACKET
+
+
+def test_clock_offset_from_the_fastest_exchange(monkeypatch):
+    # Server clock 5 ms ahead of ours. Each exchange is (t1, one-way out,
+    # one-way back), in ms; the server answers 1 ms after receiving.
+    skew, ms = 5, 1000000
+    exchanges = [(0, 10, 10), (100, 30, 10), (200, 1, 1), (300, 2, 40)]
+    mine, server = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    t4s = []
+    for t1, up, down in exchanges:
+        t2 = t1 + up + skew
+        t3 = t2 + 1
+        t4s.append((t3 - skew + down) * ms)
+        server.send(protocol.pack(protocol.KIND_PONG, protocol.FMT_PCM16, 1, 0, 1, 0, 0, 44100)
+                    + protocol.PONG.pack(t1 * ms, t2 * ms, t3 * ms))
+    sender = protocol.StreamSender(mine, None, 44100)
+    sender._pings_out = len(exchanges)
+    monkeypatch.setattr(protocol.time, 'monotonic_ns', iter(t4s).__next__)
+    try:
+        sender._read_replies()
+    finally:
+        mine.close()
+        server.close()
+    assert sender._pings_out == 0
+    # The 2 ms round trip has the least queueing; the asymmetric ones
+    # would put the offset at 15 ms and -14 ms.
+    assert sender.rtt == 2 * ms
+    assert sender.offset == skew * ms
+    assert sorted(sender._samples)[-1] == (42 * ms, -14 * ms)
@@ -0,0 +1,52 @@
+"""
+AsyncReceiver tests over real localhost sockets, with a stand-in engine.
+"""
+import socket
+import threading
+import time
+
+from receiver import AsyncReceiver
+
+
+class Engine:
+    """Records datagrams; raises on the ones that start with b'bad'."""
+
+    def __init__(self):
+        self.got = []
+        self.serviced = 0
+
+    def handle(self, data, addr):
+        data = bytes(data)      # a view of the reader's buffer
+        if data.startswith(b'bad'):
+            raise RuntimeError('bad datagram')
+        self.got.append(data)
+
+    def service(self):
+        self.serviced += 1
+        if self.serviced == 1:
+            raise RuntimeError('bad service')
+
+
+def test_a_failing_datagram_does_not_stop_serving():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    engine = Engine()
+    rx = AsyncReceiver(engine, [sock])
+    thread = threading.Thread(target=rx.run)
+    thread.start()
+    try:
+        for data in (b'bad 1', b'good 1', b'bad 2', b'good 2'):
+            out.sendto(data, sock.getsockname())
+        deadline = time.monotonic() + 2.0
+        while (len(engine.got) < 2 or engine.serviced < 2) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert engine.got == [b'good 1', b'good 2']
+        assert engine.serviced > 1
+        assert rx.failures == 3
+        assert thread.is_alive()
+    finally:
+        rx.stop()
+        thread.join(2.0)
+        out.close()
+        sock.close()
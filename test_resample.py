@@ -0,0 +1,49 @@
+"""
+Resampler tests: aliasing on decimation, and output that does not depend
+on how the input is cut into blocks.
+"""
+import numpy as np
+
+from resample import Resampler
+
+
+def run(ratio, x, block):
+    r = Resampler(ratio)
+    return np.concatenate([r.process(x[i:i + block]).copy() for i in range(0, len(x), block)])
+
+
+def spectrum(y, rate):
+    y = y[1000:-1000, 0]
+    sp = np.abs(np.fft.rfft(y * np.hanning(len(y))))
+    return np.fft.rfftfreq(len(y), 1 / rate), sp
+
+
+def tone(hz, rate, seconds=1.0):
+    t = np.arange(int(rate * seconds)) / rate
+    return (10000 * np.sin(2 * np.pi * hz * t)).astype(np.float32)[:, None]
+
+
+def test_decimation_does_not_alias():
+    # A 12 kHz tone has no place at 16 kHz; it must not fold back to 4 kHz.
+    fr, sp = spectrum(run(16000 / 44100, tone(12000, 44100), 1024), 16000)
+    ref = spectrum(run(16000 / 44100, tone(3000, 44100), 1024), 16000)[1].max()
+    assert sp.max() < ref * 10 ** (-60 / 20)
+
+
+def test_drift_ratio_keeps_high_frequencies_steady():
+    # A slowly sweeping read position must not modulate a 12 kHz tone.
+    y = run(1.0003, tone(12000, 44100, 2.0), 1024)[2000:-2000, 0]
+    env = np.sqrt(np.convolve(y * y, np.ones(441) / 441, mode='valid'))
+    assert 20 * np.log10(env.max() / env.min()) < 0.2
+
+
+def test_block_sizes_do_not_matter():
+    x = np.concatenate([tone(hz, 44100, 0.3) for hz in (300, 5000, 15000)], axis=1)
+    whole = run(48000 / 44100, x, len(x))
+    r, parts, i = Resampler(48000 / 44100), [], 0
+    for n in [100, 441, 1024, 7, 2000, 3000] * 2:
+        parts.append(r.process(x[i:i + n]).copy())
+        i += n
+    parts = np.concatenate(parts)
+    n = min(len(parts), len(whole))
+    assert np.abs(parts[:n] - whole[:n]).max() < 1.0